@@ -0,0 +1,58 @@
+"""
+Compares writing the same rows with the CSV writer and the Arrow (Parquet and IPC)
+writer, and reading the files back with ``csv.reader`` and pyarrow.
+
+Run from the repository root with ``python -m benchmarks.bench_arrow``
+"""
+import csv
+import timeit
+from io import BytesIO, StringIO
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from json_excel_converter.arrow import Writer as ArrowWriter
+from json_excel_converter.csv import Writer as CSVWriter
+from json_excel_converter.linearize import Columns
+
+
+def record(i, width=50):
+    rec = {'col%02d' % c: i * c if c % 2 else 'value %d' % (i % 100) for c in range(width)}
+    rec['tags'] = ['t%d' % t for t in range(i % 5)]
+    return rec
+
+
+def bench(rows):
+    data = [record(i) for i in range(rows)]
+    cols = Columns()
+    for d in data:
+        cols.check(d)
+    plan = cols.compile()
+    output = [plan.output(d) for d in data]
+
+    def run(writer):
+        writer.start()
+        writer.layout_changed(cols)
+        for row in output:
+            writer.write_row(row, None)
+        writer.finish()
+        return writer.file.getvalue()
+
+    writers = [
+        ('csv', lambda: CSVWriter(StringIO()),
+         lambda content: list(csv.reader(StringIO(content)))),
+        ('parquet', lambda: ArrowWriter(BytesIO()),
+         lambda content: pq.read_table(BytesIO(content))),
+        ('ipc', lambda: ArrowWriter(BytesIO(), format='ipc'),
+         lambda content: pa.ipc.open_file(BytesIO(content)).read_all()),
+    ]
+    for name, writer_factory, reader in writers:
+        content = run(writer_factory())
+        write = min(timeit.repeat(lambda: run(writer_factory()), number=1, repeat=3))
+        read = min(timeit.repeat(lambda: reader(content), number=1, repeat=3))
+        print('%-8s %d rows x %d columns: write %.0f rows/s, read %.0f rows/s, %d bytes' % (
+            name, rows, cols.columns_taken, rows / write, rows / read, len(content)))
+
+
+if __name__ == '__main__':
+    bench(50000)
@@ -0,0 +1,62 @@
+"""
+Compares the batched CSV writer with padding templates with the previous per-row,
+per-cell implementation of ``csv.Writer.write_row`` on a 200 column export.
+
+Run from the repository root with ``python -m benchmarks.bench_csv``
+"""
+import csv
+import timeit
+from io import StringIO
+
+from json_excel_converter.csv import Writer
+from json_excel_converter.linearize import Columns
+
+
+class PerCellWriter(Writer):
+    """
+    The previous implementation: padding built cell by cell, one ``writerow`` per row
+    """
+
+    def write_row(self, row, data):
+        out = []
+        for v, (_, columns) in zip(row.values, row.layout):
+            out.append('' if v is None else v)
+            if columns > 1:
+                out.extend([''] * (columns - 1))
+        self.csv.writerow(out)
+
+
+def record(i, width=200):
+    rec = {'col%03d' % c: 'value %d' % (i + c) for c in range(width - 10)}
+    # a sparse array and a missing object produce padding cells
+    rec['tags'] = ['t%d' % t for t in range(i % 5)]
+    if i % 2:
+        rec['extra'] = {'a': i, 'b': i + 1}
+    return rec
+
+
+def bench(rows):
+    data = [record(i) for i in range(rows)]
+    cols = Columns()
+    for d in data:
+        cols.check(d)
+    plan = cols.compile()
+    output = [plan.output(d) for d in data]
+
+    def run(writer_class):
+        writer = writer_class(StringIO())
+        writer.start()
+        for row in output:
+            writer.write_row(row, None)
+        writer.finish()
+        return writer.file.getvalue()
+
+    assert run(Writer) == run(PerCellWriter)
+    previous = min(timeit.repeat(lambda: run(PerCellWriter), number=1, repeat=5))
+    batched = min(timeit.repeat(lambda: run(Writer), number=1, repeat=5))
+    print('%d rows x %d columns: per cell %.0f rows/s, batched %.0f rows/s, speedup %.1fx' % (
+        rows, cols.columns_taken, rows / previous, rows / batched, previous / batched))
+
+
+if __name__ == '__main__':
+    bench(20000)
@@ -0,0 +1,40 @@
+"""
+Compares the generator based ``Columns.output`` with the compiled plan returned
+from ``Columns.compile`` on deep and wide documents.
+
+Run from the repository root with ``python -m benchmarks.bench_output``
+"""
+import timeit
+
+from json_excel_converter.linearize import Columns
+
+
+def wide_record(width=200):
+    return {'col%03d' % i: i for i in range(width)}
+
+
+def deep_record(depth=8, breadth=3):
+    if not depth:
+        return 'leaf'
+    return {
+        'k%d' % i: [deep_record(depth - 3, breadth), deep_record(depth - 3, breadth)]
+        if i == 0 and depth > 3 else deep_record(depth - 1, breadth)
+        for i in range(breadth)
+    }
+
+
+def bench(name, record, number):
+    cols = Columns()
+    cols.check(record)
+    plan = cols.compile()
+    assert plan.output(record) == list(cols.output(record))
+
+    generator = timeit.timeit(lambda: list(cols.output(record)), number=number)
+    compiled = timeit.timeit(lambda: plan.output(record), number=number)
+    print('%-6s %5d cells: generator %.3fs, compiled %.3fs, speedup %.1fx' % (
+        name, cols.columns_taken, generator, compiled, generator / compiled))
+
+
+if __name__ == '__main__':
+    bench('wide', wide_record(), 2000)
+    bench('deep', deep_record(), 200)
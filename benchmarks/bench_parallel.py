@@ -0,0 +1,77 @@
+"""
+Measures the scaling of the parallel conversion (``Converter(executor=...)``) with
+the number of worker processes, compared to the sequential two pass conversion,
+with the layout inferred in parallel and with a known layout (``schema``), where
+the records are sent to the workers only once.
+
+Run from the repository root with ``python -m benchmarks.bench_parallel``.
+The speedup is bound by the number of available cores and by the work done
+in this process - splitting the data into chunks, pickling them and passing
+the rows to the writer. The bound (the sequential time divided by the cpu time
+of this process) is printed as well.
+"""
+import os
+import time
+import timeit
+from concurrent.futures import ProcessPoolExecutor
+
+from json_excel_converter import Converter, Writer
+
+
+class NullWriter(Writer):
+    def write_header(self, header):
+        pass
+
+    def write_row(self, row, data):
+        pass
+
+
+def record(i):
+    return {
+        'id': i,
+        'title': 'record %d' % i,
+        'authors': [{'name': 'author %d' % a, 'affiliation': {'name': 'org %d' % a,
+                                                              'country': 'cz'}}
+                    for a in range(i % 5 + 1)],
+        'keywords': ['k%d' % k for k in range(i % 8)],
+        'metadata': {'m%d' % m: m * i for m in range(20)},
+    }
+
+
+def bench(count, chunk_size=2000):
+    data = [record(i) for i in range(count)]
+    schema = Converter().infer_schema(data)
+
+    sequential = min(timeit.repeat(
+        lambda: Converter(two_pass=True).convert(data, NullWriter()), number=1, repeat=3))
+    print('%d records, %d columns, %d cores: sequential %.2fs' % (
+        count, schema.columns_taken, os.cpu_count(), sequential))
+
+    for workers in (1, 2, 4, 8, 16, 32):
+        if workers > (os.cpu_count() or 1):
+            break
+        with ProcessPoolExecutor(workers) as executor:
+            # start the worker processes
+            list(executor.map(abs, range(workers)))
+            results = []
+            for kwargs in ({}, {'schema': schema}):
+                conv = Converter(executor=executor, chunk_size=chunk_size, **kwargs)
+                wall, cpu = min(run(conv, data) for _ in range(3))
+                results.extend([wall, sequential / wall, sequential / cpu])
+        print('%2d workers: inferred layout %.2fs (%.1fx, at most %.1fx), '
+              'known layout %.2fs (%.1fx, at most %.1fx)' % (workers, *results))
+
+
+def run(conv, data):
+    """
+    Returns the wall time of the conversion and the cpu time spent in this process,
+    which bounds the speedup
+    """
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    conv.convert(data, NullWriter())
+    return time.perf_counter() - wall, time.process_time() - cpu
+
+
+if __name__ == '__main__':
+    bench(100000)
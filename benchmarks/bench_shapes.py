@@ -0,0 +1,66 @@
+"""
+Measures the shape cache of ``Converter`` (``shape_cache_size``): the cost of computing
+the fingerprints compared to ``Columns.check`` and the time of the layout inference pass
+and of a two pass conversion with and without the cache, on records of a few shapes.
+
+Run from the repository root with ``python -m benchmarks.bench_shapes``
+"""
+import timeit
+
+from json_excel_converter import Converter, Writer
+from json_excel_converter.linearize import Columns, fingerprint
+
+
+class NullWriter(Writer):
+    def write_header(self, header):
+        pass
+
+    def write_row(self, row, data):
+        pass
+
+
+def record(i):
+    rec = {
+        'id': i,
+        'title': 'record %d' % i,
+        'created': '2020-01-%02d' % (i % 28 + 1),
+        'authors': [{'name': 'author %d' % a, 'affiliation': 'org %d' % a}
+                    for a in range(i % 3 + 1)],
+        'keywords': ['k%d' % k for k in range(i % 4)],
+        'metadata': {'language': 'en', 'pages': i % 300, 'open': bool(i % 2),
+                     'funding': None if i % 5 else {'agency': 'x', 'grant': i}},
+    }
+    if i % 7 == 0:
+        rec['note'] = 'note'
+    return rec
+
+
+def bench(count):
+    data = [record(i) for i in range(count)]
+    cols = Columns()
+    for d in data:
+        cols.check(d)
+
+    fingerprints = min(timeit.repeat(lambda: [fingerprint(d) for d in data],
+                                     number=1, repeat=5))
+    checks = min(timeit.repeat(lambda: [cols.check(d) for d in data], number=1, repeat=5))
+    print('%d records, %d shapes: fingerprints %.3fs, checks %.3fs (%.0f%%)' % (
+        count, len({fingerprint(d) for d in data}), fingerprints, checks,
+        fingerprints / checks * 100))
+
+    def infer(size):
+        return lambda: Converter(shape_cache_size=size).infer_schema(data)
+
+    def convert(size):
+        return lambda: Converter(two_pass=True, shape_cache_size=size).convert(
+            data, NullWriter())
+
+    for name, run in (('inference', infer), ('two pass convert', convert)):
+        plain = min(timeit.repeat(run(None), number=1, repeat=3))
+        cached = min(timeit.repeat(run(1024), number=1, repeat=3))
+        print('%-17s without cache %.3fs, with cache %.3fs, speedup %.1fx' % (
+            name, plain, cached, plain / cached))
+
+
+if __name__ == '__main__':
+    bench(50000)
@@ -0,0 +1,39 @@
+"""
+Compares the xlsx writers on a wide export: the buffering Writer, StreamingWriter
+(xlsxwriter in constant_memory mode) and NativeWriter (xml written directly).
+
+Run from the repository root with ``python -m benchmarks.bench_xlsx``
+"""
+import time
+from io import BytesIO
+
+from json_excel_converter import Converter
+from json_excel_converter.linearize import Columns
+from json_excel_converter.xlsx import Writer, StreamingWriter
+from json_excel_converter.xlsx.formats import Bold, LastUnderlined
+from json_excel_converter.xlsx.native import NativeWriter
+
+
+def record(i, width=50):
+    rec = {'col%02d' % c: ('value %d' % (i + c)) if c % 2 else i + c for c in range(width)}
+    rec['tags'] = ['t%d' % t for t in range(i % 3)]
+    return rec
+
+
+def bench(rows):
+    data = [record(i) for i in range(rows)]
+    schema = Columns()
+    for d in data:
+        schema.check(d)
+    for writer_class in (Writer, StreamingWriter, NativeWriter):
+        w = writer_class(BytesIO(), header_formats=(Bold, LastUnderlined),
+                         data_formats=(LastUnderlined,))
+        t = time.perf_counter()
+        Converter(schema=schema).convert(data, w)
+        elapsed = time.perf_counter() - t
+        print('%-16s %d rows x %d columns: %.2fs, %.0f rows/s' % (
+            writer_class.__name__, rows, schema.columns_taken, elapsed, rows / elapsed))
+
+
+if __name__ == '__main__':
+    bench(20000)
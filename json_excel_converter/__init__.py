@@ -4,6 +4,16 @@ from .options import Options
 
 
 class Writer:
+    #: False if the writer outputs rows as they arrive and can not discard them in ``reset``.
+    #: Converter does not restart the conversion with such writers, it infers the columns
+    #: layout in a separate pass instead.
+    supports_restart = True
+
+    #: True if the writer can take a wider columns layout in the middle of the conversion
+    #: (see ``layout_changed``). Converter does not restart the conversion with such
+    #: writers, it notifies them and writes the header of the new layout instead.
+    supports_widening = False
+
     def __init__(self):
         pass
 
@@ -20,6 +30,15 @@ class Writer:
         """
         pass  # pragma: no cover
 
+    def layout_changed(self, columns):
+        """
+        Called with the columns layout before its header is written - at the start and,
+        for writers that support widening, whenever a record has widened the layout.
+        Rows written after this call follow the new layout.
+        :param columns: an instance of Columns, must not be modified
+        """
+        pass
+
     def write_header(self, header):
         """
         Writes a header. Can be called multiple times to write subheaders
@@ -0,0 +1,269 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
+from .buffer import RecordCache
+from .converter import Converter
+from .linearize import Columns, LinearizationError
+
+# python 3.6 has no get_running_loop, get_event_loop returns the running loop there
+# when called from a coroutine or a callback
+_get_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+class AsyncWriter:
+    """
+    Base class of writers with coroutine hooks, see ``json_excel_converter.Writer``
+    for the meaning of the hooks and attributes. Rows are passed in chunks
+    to ``write_rows``.
+    """
+    supports_restart = True
+    supports_widening = False
+
+    async def start(self):
+        pass  # pragma: no cover
+
+    async def reset(self):
+        pass  # pragma: no cover
+
+    async def layout_changed(self, columns):
+        pass
+
+    async def write_header(self, header):
+        """
+        :param header: a list of Value instances
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+    async def write_rows(self, rows):
+        """
+        :param rows: a list of (row, data) tuples
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+    async def finish(self):
+        pass  # pragma: no cover
+
+
+class SyncWriterAdapter(AsyncWriter):
+    """
+    Runs a synchronous writer from coroutines. ``start``, ``reset``, the rows and ``finish``
+    (which builds the whole workbook in case of the xlsx writer) are run in the executor,
+    so the event loop is not blocked by them. The calls are never concurrent.
+    """
+
+    def __init__(self, writer, executor=None):
+        """
+        :param writer:      an instance of ``json_excel_converter.Writer``
+        :param executor:    ``concurrent.futures.ThreadPoolExecutor``, the loop's default
+                            if None
+        """
+        check_executor(executor)
+        self.writer = writer
+        self.executor = executor
+
+    @property
+    def supports_restart(self):
+        return self.writer.supports_restart
+
+    @property
+    def supports_widening(self):
+        return self.writer.supports_widening
+
+    async def start(self):
+        await self._run(self.writer.start)
+
+    async def reset(self):
+        await self._run(self.writer.reset)
+
+    async def layout_changed(self, columns):
+        self.writer.layout_changed(columns)
+
+    async def write_header(self, header):
+        self.writer.write_header(header)
+
+    async def write_rows(self, rows):
+        await self._run(self._write_rows, rows)
+
+    async def finish(self):
+        await self._run(self.writer.finish)
+
+    def _write_rows(self, rows):
+        for row, data in rows:
+            self.writer.write_row(row, data)
+
+    def _run(self, func, *args):
+        return _get_running_loop().run_in_executor(self.executor, partial(func, *args))
+
+
+class AsyncConverter(Converter):
+    """
+    A converter for asyncio applications. The records are taken from an async iterable
+    (or a plain iterable) in chunks of ``chunk_size`` records, the chunks are checked and
+    linearized in the executor and passed to an AsyncWriter (synchronous writers are
+    wrapped in SyncWriterAdapter). The columns layout is modified in the executor, so it
+    must be a ``ThreadPoolExecutor`` (the loop's default executor is used if None),
+    ValueError is raised for other executors.
+
+    The async iterable is consumed only once. If the conversion has to be restarted
+    or the layout has to be inferred first, the consumed records are kept in a RecordCache
+    (``max_resident_records`` in memory, the rest in a temporary file in ``tmpdir``).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        check_executor(self.executor)
+
+    async def convert_async(self, data, writer):
+        """
+        :param data:    an async iterable (or an iterable) of json records
+        :param writer:  an instance of AsyncWriter or ``json_excel_converter.Writer``
+        """
+        if not isinstance(writer, AsyncWriter):
+            writer = SyncWriterAdapter(writer, self.executor)
+        self.conv = None
+        self.restarts = 0
+        source = _chunks(data, self.chunk_size)
+        infer_first = self.two_pass or not writer.supports_restart
+        cache = None
+        if self.schema is None and (infer_first or not writer.supports_widening):
+            cache = RecordCache((), self.max_resident_records, self.tmpdir)
+        try:
+            if self.schema is not None:
+                try:
+                    await self._output_async(None, source, writer, self.schema,
+                                             fixed=True, validate=True)
+                except LinearizationError:
+                    await writer.reset()
+                    raise
+                return
+            if infer_first:
+                columns = Columns(options=self.options)
+                async for chunk in source:
+                    await self._run(self._infer_async_chunk, cache, columns, chunk)
+                await self._output_async(cache, source, writer, columns, fixed=True)
+                return
+            self.conv = Columns(options=self.options)
+            while True:
+                try:
+                    await self._output_async(cache, source, writer, self.conv, fixed=False)
+                    break
+                except LinearizationError:
+                    await writer.reset()
+                    self.restarts += 1
+            self.conv = None
+        finally:
+            if cache is not None:
+                cache.close()
+
+    async def _output_async(self, cache, source, writer, columns, fixed, validate=False):
+        """
+        Replays the cached records, then consumes the rest of the source. If the layout
+        is not ``fixed``, it is extended by the records and a record that does not fit
+        raises LinearizationError unless the writer supports widening.
+        """
+        await writer.start()
+        plan = None
+        if fixed:
+            await self._write_header_async(writer, columns)
+            plan = columns.compile()
+
+        async def output(chunk):
+            nonlocal plan
+            pos = 0
+            while pos < len(chunk):
+                rows, pos, errors = await self._run(
+                    self._linearize_chunk, columns, chunk, pos, plan, validate)
+                if rows:
+                    await writer.write_rows(rows)
+                if pos < len(chunk):
+                    if plan is not None and (fixed or not writer.supports_widening):
+                        raise LinearizationError(errors)
+                    # the first record or a record that has widened the layout
+                    await self._write_header_async(writer, columns)
+                    plan = columns.compile()
+
+        if cache is not None:
+            replay = iter(cache)
+            while True:
+                chunk = await self._run(_next_chunk, replay, self.chunk_size)
+                if not chunk:
+                    break
+                await output(chunk)
+        async for chunk in source:
+            if cache is not None:
+                await self._run(_cache_chunk, cache, chunk)
+            await output(chunk)
+        await writer.finish()
+
+    def _linearize_chunk(self, columns, chunk, start, plan, validate):
+        """
+        Checks and outputs the records of the chunk from ``start``. Stops at the first
+        record if there is no plan yet, or at a record that does not fit into the layout.
+
+        :return: a tuple of (rows, index of the record it stopped at, errors)
+        """
+        rows = []
+        errors = []
+        idx = start
+        while idx < len(chunk):
+            d = chunk[idx]
+            errors = self._check(columns, d, validate=validate)
+            if plan is None or errors:
+                break
+            rows.append((plan.output(d), d))
+            idx += 1
+        if rows and plan.has_batches:
+            plan.translate_batches()
+        return rows, idx, errors
+
+    def _infer_async_chunk(self, cache, columns, chunk):
+        _cache_chunk(cache, chunk)
+        for d in chunk:
+            self._check(columns, d)
+
+    async def _write_header_async(self, writer, columns):
+        await writer.layout_changed(columns)
+        for d in range(columns.depth):
+            await writer.write_header(list(columns.get_header_row(d)))
+
+    def _run(self, func, *args):
+        return _get_running_loop().run_in_executor(self.executor, partial(func, *args))
+
+
+def check_executor(executor):
+    """
+    Raises ValueError if the executor does not run the calls in this process - the columns
+    layout and the writer modified in other processes would not be seen here
+    """
+    if executor is not None and not isinstance(executor, ThreadPoolExecutor):
+        raise ValueError('A ThreadPoolExecutor (or None for the loop\'s default executor) '
+                         'is required, got %r' % executor)
+
+
+async def _chunks(data, size):
+    chunk = []
+    if hasattr(data, '__aiter__'):
+        async for d in data:
+            chunk.append(d)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    else:
+        for d in data:
+            chunk.append(d)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _next_chunk(it, size):
+    return list(islice(it, size))
+
+
+def _cache_chunk(cache, chunk):
+    for d in chunk:
+        cache.append(d)
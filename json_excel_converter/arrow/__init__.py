@@ -0,0 +1,289 @@
+from collections import Counter
+from io import BytesIO
+from itertools import zip_longest
+
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet
+
+from json_excel_converter import Writer as bWriter
+from json_excel_converter.linearize import LayoutCache, Row, padding_template
+
+
+class Writer(bWriter):
+    """
+    Writes the rows as Apache Arrow record batches into a Parquet file (``format='parquet'``)
+    or an Arrow IPC file (``format='ipc'``). The header rows are not written, each output
+    column becomes a column named by its dotted path. Array items are distinguished by
+    their index, for example ``b[0].c`` and ``b[1].c``.
+
+    The rows are collected and written in batches of ``batch_size`` rows. The type of each
+    column is inferred from the first batch (unless given in ``types``) and is kept for
+    the rest of the file. Empty cells are written as nulls, columns with only empty cells
+    in the first batch and columns with mixed value types are written as strings, columns
+    with ints and floats as floats. A value that can not be converted to the type
+    of its column without a loss (for example a float in an int column) raises TypeError.
+    """
+    #: the maximum number of cached padding templates
+    max_templates = 4096
+
+    def __init__(self, file=None, format='parquet', batch_size=10000, types=None,
+                 compression='snappy'):
+        """
+        :param file:        file name or a binary file-like object. BytesIO if None
+        :param format:      'parquet' or 'ipc'
+        :param batch_size:  the number of rows in a record batch (a row group in parquet)
+        :param types:       a dictionary of column name => pyarrow type for the columns
+                            whose type should not be inferred
+        :param compression: parquet compression codec, ignored for the ipc format
+        """
+        super().__init__()
+        if format not in ('parquet', 'ipc'):
+            raise ValueError('Unsupported format %r, use "parquet" or "ipc"' % format)
+        if file is None:
+            file = BytesIO()
+        self.file = file
+        self.format = format
+        self.batch_size = batch_size
+        self.types = types or {}
+        self.compression = compression
+        self.names = None
+        self.headers = []
+        self.schema = None
+        self.fd = None
+        self.sink = None
+        self.pending = []
+        self.templates = LayoutCache(padding_template, self.max_templates)
+
+    def start(self):
+        if isinstance(self.file, str):
+            self.fd = open(self.file, 'wb')
+        else:
+            self.fd = self.file
+        self.names = None
+        self.headers = []
+        self.schema = None
+        self.sink = None
+        self.pending = []
+        self.templates.clear()
+
+    def reset(self):
+        self.pending = []
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+        if self.fd is not None:
+            self.fd.seek(0)
+            self.fd.truncate()
+
+    def finish(self):
+        try:
+            self.flush()
+            if self.sink is None:
+                # no rows, write just the schema
+                self.open_sink(pa.schema([
+                    (name, self.types.get(name, pa.string())) for name in self.column_names()
+                ]))
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Closes the sink and the file if it has been opened from a file name. Called
+        from ``finish`` and when writing the rows fails.
+        """
+        try:
+            if self.sink is not None:
+                self.sink.close()
+        finally:
+            self.sink = None
+            if self.fd is not None:
+                self.fd.flush()
+                if isinstance(self.file, str):
+                    self.fd.close()
+            self.fd = None
+
+    def layout_changed(self, columns):
+        self.names = slot_names(columns.slots())
+        self.headers = []
+
+    def write_header(self, header):
+        # kept only to name the columns if layout_changed has not been called
+        self.headers.append(list(header))
+
+    def write_row(self, row, data):
+        self.pending.append(self.cells(row))
+        if len(self.pending) >= self.batch_size:
+            try:
+                self.flush()
+            except Exception:
+                self.close()
+                raise
+
+    def flush(self):
+        """
+        Writes the collected rows as a record batch
+        """
+        if not self.pending:
+            return
+        names = self.column_names()
+        # a scalar in place of an array takes a single cell, so the rows might be shorter
+        columns = list(zip_longest(*self.pending))
+        empty = (None,) * len(self.pending)
+        columns.extend([empty] * (len(names) - len(columns)))
+        self.pending = []
+        if self.schema is None:
+            self.open_sink(self.infer_schema(columns))
+        arrays = [
+            column_array(values, field.name, field.type)
+            for values, field in zip(columns, self.schema)
+        ]
+        batch = pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        if self.format == 'parquet':
+            self.sink.write_table(pa.Table.from_batches([batch]))
+        else:
+            self.sink.write_batch(batch)
+
+    def open_sink(self, schema):
+        self.schema = schema
+        if self.format == 'parquet':
+            self.sink = pyarrow.parquet.ParquetWriter(self.fd, schema,
+                                                      compression=self.compression)
+        else:
+            self.sink = pyarrow.ipc.new_file(self.fd, schema)
+
+    def infer_schema(self, columns):
+        """
+        Returns the schema with the types of the columns inferred from their values
+        in the first batch
+        """
+        fields = []
+        for name, values in zip(self.column_names(), columns):
+            arrow_type = self.types.get(name)
+            if arrow_type is None:
+                arrow_type = infer_type(values)
+            fields.append(pa.field(name, arrow_type))
+        return pa.schema(fields)
+
+    def column_names(self):
+        """
+        Returns the column names, from the layout if known, otherwise from the header paths
+        """
+        if self.names is not None:
+            return self.names
+        if not self.headers:
+            return []
+        paths = []
+        for h in self.headers[-1]:
+            paths.extend([h.path] * h.columns)
+        counts = Counter(paths)
+        seen = Counter()
+        names = []
+        for path in paths:
+            if counts[path] > 1:
+                names.append('%s[%s]' % (path, seen[path]))
+                seen[path] += 1
+            else:
+                names.append(path)
+        self.names = names
+        return names
+
+    def cells(self, row):
+        """
+        Returns the cells of the row, with empty cells for the padding of multi-column values
+        """
+        if isinstance(row, Row):
+            template = self.templates(row.layout)
+            return row.values if template is None else template(row.values + [''])
+        out = []
+        for h in row:
+            out.append(h.value)
+            if h.columns > 1:
+                out.extend([''] * (h.columns - 1))
+        return out
+
+
+def slot_names(slots):
+    """
+    Returns column names for slots of ``Columns.slots()``: the keys joined with dots,
+    with the index of the item for columns that have more than one item
+    """
+    cardinality = {}
+    for slot in slots:
+        for pos in range(0, len(slot), 2):
+            key = slot[:pos + 1]
+            cardinality[key] = max(cardinality.get(key, 0), slot[pos + 1] + 1)
+    names = []
+    for slot in slots:
+        parts = []
+        for pos in range(0, len(slot), 2):
+            if cardinality[slot[:pos + 1]] > 1:
+                parts.append('%s[%s]' % (slot[pos], slot[pos + 1]))
+            else:
+                parts.append(str(slot[pos]))
+        names.append('.'.join(parts))
+    return names
+
+
+def infer_type(values):
+    """
+    Returns the pyarrow type of the values, string if it can not be inferred
+    """
+    try:
+        arrow_type = pa.array(empty_to_none(values)).type
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.string()
+    if pa.types.is_null(arrow_type):
+        return pa.string()
+    return arrow_type
+
+
+def empty_to_none(values):
+    """
+    Replaces empty strings (missing values and padding) with None
+    """
+    if '' in values:
+        return [None if v == '' else v for v in values]
+    return values
+
+
+def column_array(values, name, arrow_type):
+    """
+    Returns the values as an array of the column type. The values are converted without
+    the type first and cast safely to it, so that floats are not truncated to ints
+    and strings are not parsed to numbers.
+    """
+    values = empty_to_none(values)
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        if pa.types.is_string(arrow_type):
+            return string_array(values)
+        raise type_mismatch(name, arrow_type, e) from e
+    if array.type == arrow_type:
+        return array
+    if pa.types.is_string(arrow_type):
+        return string_array(values)
+    if pa.types.is_null(array.type) or (is_number(array.type) and is_number(arrow_type)):
+        try:
+            return array.cast(arrow_type, safe=True)
+        except pa.ArrowInvalid as e:
+            raise type_mismatch(name, arrow_type, e) from e
+    raise type_mismatch(name, arrow_type, 'got values of type %s' % array.type)
+
+
+def string_array(values):
+    # mixed value types
+    return pa.array([v if v is None or isinstance(v, str) else str(v) for v in values],
+                    type=pa.string())
+
+
+def is_number(arrow_type):
+    return pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type) or \
+        pa.types.is_decimal(arrow_type)
+
+
+def type_mismatch(name, arrow_type, reason):
+    return TypeError('Values of column %r do not match its type %s inferred from '
+                     'the first batch, pass the type in "types": %s'
+                     % (name, arrow_type, reason))
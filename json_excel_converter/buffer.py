@@ -0,0 +1,238 @@
+import pickle
+import tempfile
+from itertools import islice
+
+from .linearize import Row, Value
+
+
+class RowBuffer:
+    """
+    Keeps the rows passed to a writer, together with the source data of each row, in memory
+    """
+
+    def __init__(self):
+        self.rows = []
+
+    def append(self, row, data):
+        """
+        :param row:     a list of Value instances
+        :param data:    the source data of the row
+        """
+        self.rows.append((row, data))
+
+    def clear(self):
+        self.rows = []
+
+    @property
+    def spilled(self):
+        """
+        True if the rows are kept on disk - the writer should then avoid keeping all
+        of them in memory while writing them out
+        """
+        return False
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        """
+        :return: iterator of (row, data) tuples in the order they were appended
+        """
+        return iter(self.rows)
+
+    def __getitem__(self, idx):
+        """
+        Returns the row at the index (without its data), as the list of rows kept
+        by ``xlsx.Writer`` before the row buffers were introduced did
+        """
+        if isinstance(idx, slice):
+            return [self.entry(i)[0] for i in range(len(self))[idx]]
+        return self.entry(idx)[0]
+
+    def entry(self, idx):
+        """
+        :return: the (row, data) tuple at the index
+        """
+        return self.rows[idx]
+
+    def data(self):
+        """
+        :return: a list of the source data of the rows
+        """
+        return [d for _, d in self]
+
+
+class SpillingRowBuffer(RowBuffer):
+    """
+    Keeps the rows in memory until they contain more than ``max_cells`` cells, then moves
+    them to a temporary file and appends all the following rows to the file. Lists of Value
+    instances are stored as lists of plain tuples, Row instances as their values with
+    an index into a table of row layouts kept in memory. Rows are read back on iteration.
+    """
+
+    def __init__(self, max_cells=1000000, tmpdir=None):
+        """
+        :param max_cells:   the number of cells (Value instances) kept in memory
+                            before the rows are spilled to disk
+        :param tmpdir:      directory for the temporary file, system default if None
+        """
+        super().__init__()
+        self.max_cells = max_cells
+        self.tmpdir = tmpdir
+        self.cells = 0
+        self.spill = None
+        self.layouts = []
+        self.layout_index = {}
+
+    def append(self, row, data):
+        if self.spill is not None:
+            self.spill.append((self._dump_row(row), data))
+            return
+        super().append(row, data)
+        self.cells += len(row)
+        if self.cells > self.max_cells:
+            self.spill = SpillFile(tmpdir=self.tmpdir)
+            for r, d in self.rows:
+                self.spill.append((self._dump_row(r), d))
+            self.rows = []
+
+    def clear(self):
+        super().clear()
+        self.cells = 0
+        self.layouts = []
+        self.layout_index = {}
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+    @property
+    def spilled(self):
+        return self.spill is not None
+
+    def __len__(self):
+        if self.spill is not None:
+            return len(self.spill)
+        return super().__len__()
+
+    def __iter__(self):
+        if self.spill is None:
+            return super().__iter__()
+        return ((self._load_row(r), d) for r, d in self.spill)
+
+    def entry(self, idx):
+        if self.spill is None:
+            return super().entry(idx)
+        # the spilled rows are read sequentially, indexing them is slow
+        count = len(self)
+        if idx < 0:
+            idx += count
+        if not 0 <= idx < count:
+            raise IndexError('row index out of range')
+        return next(islice(iter(self), idx, None))
+
+    def _dump_row(self, row):
+        if isinstance(row, Row):
+            idx = self.layout_index.get(row.layout)
+            if idx is None:
+                idx = self.layout_index[row.layout] = len(self.layouts)
+                self.layouts.append(row.layout)
+            return idx, row.values, row.urls
+        return [(v.value, v.columns, v.span, v.path, v.has_children, v.url) for v in row]
+
+    def _load_row(self, row):
+        if isinstance(row, tuple):
+            idx, values, urls = row
+            return Row(values, self.layouts[idx], urls)
+        return [Value(*v) for v in row]
+
+
+class SpillFile:
+    """
+    An append-only temporary file of pickled items
+    """
+
+    def __init__(self, tmpdir=None):
+        self.file = tempfile.TemporaryFile(dir=tmpdir)
+        self.count = 0
+        self.at_end = True
+
+    def append(self, item):
+        if not self.at_end:
+            self.file.seek(0, 2)
+            self.at_end = True
+        pickle.dump(item, self.file, pickle.HIGHEST_PROTOCOL)
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """
+        Reads the items appended so far. Items must not be appended while iterating.
+        """
+        count = self.count
+        self.at_end = False
+        self.file.seek(0)
+        for _ in range(count):
+            yield pickle.load(self.file)
+
+
+class RecordCache:
+    """
+    Makes a one-shot iterable of records (a generator, a database cursor, ...) iterable
+    repeatedly. The records consumed from the source are kept, up to ``max_resident``
+    of them in memory, then all of them are moved to a temporary file. Each iteration
+    replays the kept records and then continues consuming the source, so an iteration that
+    was not finished (for example interrupted by ``LinearizationError``) does not lose
+    any records. Only one iteration may be in progress at a time.
+    """
+
+    def __init__(self, source, max_resident=10000, tmpdir=None):
+        """
+        :param source:          an iterable of records, iterated only once
+        :param max_resident:    the number of records kept in memory before they are
+                                moved to a temporary file
+        :param tmpdir:          directory for the temporary file, system default if None
+        """
+        self.source = iter(source)
+        self.max_resident = max_resident
+        self.tmpdir = tmpdir
+        self.records = []
+        self.spill = None
+
+    def __len__(self):
+        """
+        :return: the number of records consumed from the source so far
+        """
+        if self.spill is not None:
+            return len(self.spill)
+        return len(self.records)
+
+    def __iter__(self):
+        if self.spill is not None:
+            yield from self.spill
+        else:
+            yield from self.records
+        for record in self.source:
+            self.append(record)
+            yield record
+
+    def append(self, record):
+        if self.spill is not None:
+            self.spill.append(record)
+            return
+        self.records.append(record)
+        if len(self.records) > self.max_resident:
+            self.spill = SpillFile(tmpdir=self.tmpdir)
+            for r in self.records:
+                self.spill.append(r)
+            self.records = []
+
+    def close(self):
+        self.records = []
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
@@ -0,0 +1,68 @@
+import argparse
+import os
+import sys
+
+from .converter import Converter
+from .sources import JSONArraySource, JSONLinesSource, open_source
+
+OUTPUT_EXTENSIONS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+}
+
+
+def get_writer(output, output_format, streaming):
+    if output_format == 'csv':
+        from .csv import Writer
+        return Writer(file=output)
+    if output_format in ('parquet', 'arrow'):
+        from .arrow import Writer
+        return Writer(file=output, format='parquet' if output_format == 'parquet' else 'ipc')
+    from .xlsx import StreamingWriter, Writer
+    if streaming:
+        return StreamingWriter(file=output)
+    return Writer(file=output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='json-excel-converter',
+        description='Converts a json array or a JSON lines file to CSV, XLSX, Parquet '
+                    'or Arrow')
+    parser.add_argument('input', help='input file, .jsonl or .ndjson for JSON lines, '
+                                      'a json array otherwise. "-" for standard input')
+    parser.add_argument('output', help='output file, .csv, .xlsx, .parquet or .arrow')
+    parser.add_argument('--input-format', choices=('json', 'jsonl'),
+                        help='format of the input, guessed from the file name if not set')
+    parser.add_argument('--output-format', choices=('csv', 'xlsx', 'parquet', 'arrow'),
+                        help='format of the output, guessed from the file name if not set')
+    parser.add_argument('--encoding', default='utf-8', help='encoding of the input file')
+    parser.add_argument('--two-pass', action='store_true',
+                        help='infer the columns layout before writing the rows')
+    parser.add_argument('--streaming', action='store_true',
+                        help='write the xlsx rows as they arrive, the input is read twice')
+    args = parser.parse_args(argv)
+
+    output_format = args.output_format
+    if output_format is None:
+        output_format = OUTPUT_EXTENSIONS.get(os.path.splitext(args.output)[1].lower(), 'xlsx')
+
+    source = sys.stdin if args.input == '-' else args.input
+    if args.input_format == 'jsonl':
+        data = JSONLinesSource(source, encoding=args.encoding)
+    elif args.input_format == 'json':
+        data = JSONArraySource(source, encoding=args.encoding)
+    else:
+        data = open_source(source, encoding=args.encoding)
+    if args.input == '-':
+        # standard input can be read only once, the converter keeps the records
+        data = iter(data)
+
+    conv = Converter(two_pass=args.two_pass)
+    conv.convert(data, get_writer(args.output, output_format, args.streaming))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,41 +1,295 @@
-from .linearize import Columns, LinearizationError
+import pickle
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from .buffer import RecordCache
+from .linearize import Columns, LinearizationError, ShapeCache, fingerprint
 from .options import Options, EMPTY_OPTIONS
 
 
 class Converter:
-    def __init__(self, options=EMPTY_OPTIONS):
+    #: the maximum number of chunks submitted to the executor and not yet written
+    max_pending_chunks = 16
+
+    def __init__(self, options=EMPTY_OPTIONS, two_pass=False, schema=None,
+                 executor=None, chunk_size=1000, shape_cache_size=None,
+                 max_resident_records=10000, tmpdir=None):
+        """
+        :param options:     an instance of Options class
+        :param two_pass:    if True, ``convert`` first infers the columns layout from all
+                            the data (without outputting anything) and then outputs the rows
+                            in a single pass. No restarts are needed, but the data must be
+                            iterable twice. Always used with writers that do not support
+                            restarts.
+        :param schema:      a frozen columns layout (an instance of Columns, for example
+                            loaded via ``json_excel_converter.schema.load_schema``). If set,
+                            no layout inference is performed, the records are only validated
+                            against the schema and ``LinearizationError`` is raised if a record
+                            does not fit into it.
+        :param executor:    an instance of ``concurrent.futures.Executor``. If set, ``convert``
+                            splits the data into chunks of ``chunk_size`` records, infers
+                            the layout of each chunk on the executor and merges the layouts,
+                            then linearizes the chunks on the executor as well. The rows are
+                            written in the original order. The data must be iterable twice
+                            (unless schema is passed) and, for process pools, the options
+                            (including translators and url functions) must be picklable.
+        :param chunk_size:  the number of records processed in one executor call and
+                            the number of rows translated at once by batch value translators
+        :param shape_cache_size:    if set, structural fingerprints of up to this number of
+                            record shapes that fit into the layout are kept (in ``shape_cache``)
+                            and records with a known fingerprint are not checked. Not used
+                            in executor calls.
+        :param max_resident_records:    if ``convert`` gets a one-shot iterator (for example
+                            a generator) and might need to iterate the data again, the consumed
+                            records are kept - up to this number in memory, then all of them
+                            in a temporary file
+        :param tmpdir:      directory for the temporary file, system default if None
+        """
         self.options = options
+        self.two_pass = two_pass
+        self.schema = schema
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.shape_cache = ShapeCache(shape_cache_size) if shape_cache_size else None
+        self.max_resident_records = max_resident_records
+        self.tmpdir = tmpdir
         self.conv = None
+        self.restarts = 0
 
     def convert(self, data, writer):
         self.conv = None
-        while True:
+        self.restarts = 0
+        if self.schema is not None:
             try:
                 self.convert_streaming(data, writer)
-                break
             except LinearizationError:
                 writer.reset()
+                raise
+            return
+        infer_first = self.two_pass or self.executor is not None or not writer.supports_restart
+        if iter(data) is data and (infer_first or not writer.supports_widening):
+            # a one-shot iterator, keep the consumed records for the next pass
+            data = RecordCache(data, self.max_resident_records, self.tmpdir)
+        try:
+            if infer_first:
+                self.convert_with_schema(data, writer, self.infer_schema(data))
+                return
+            while True:
+                try:
+                    self.convert_streaming(data, writer)
+                    break
+                except LinearizationError:
+                    writer.reset()
+                    self.restarts += 1
+        finally:
+            if isinstance(data, RecordCache):
+                data.close()
 
     def convert_streaming(self, data, writer):
+        if self.schema is not None:
+            self.convert_with_schema(data, writer, self.schema, validate=True)
+            return
         writer.start()
         if not self.conv:
             self.conv = Columns(options=self.options)
+        plan = None
+        pending = []
         for idx, d in enumerate(data):
-            errors = self.conv.check(d)
+            errors = self._check(self.conv, d)
             if not idx:
                 self._write_header(writer, self.conv)
+                # any change of the layout after the first record raises an error,
+                # so the layout is fixed for the rest of this pass
+                plan = self.conv.compile()
             elif errors:
-                raise LinearizationError(errors)
-            row = self.conv.output(d)
-            writer.write_row(row, d)
+                if not writer.supports_widening:
+                    raise LinearizationError(errors)
+                # rows output so far follow the previous layout, the writer re-projects them
+                if pending:
+                    self._flush_rows(writer, plan, pending)
+                self._write_header(writer, self.conv)
+                plan = self.conv.compile()
+            self._write_row(writer, plan, d, pending)
+        if pending:
+            self._flush_rows(writer, plan, pending)
         writer.finish()
         self.conv = None
 
+    def infer_schema(self, data):
+        """
+        Infers the columns layout from the data. Only ``Columns.check`` is called on each
+        record, no values are output.
+
+        :param data:    iterable of json records
+        :return:        an instance of Columns
+        """
+        if self.executor is not None:
+            columns = Columns(options=self.options)
+            payload = self._worker_payload(self.options)
+            for _, chunk_columns in self._map_chunks(_infer_chunk, data, payload):
+                columns.merge(chunk_columns)
+            return columns
+        columns = Columns(options=self.options)
+        for d in data:
+            self._check(columns, d)
+        return columns
+
+    def convert_with_schema(self, data, writer, columns, validate=False):
+        """
+        Outputs the data with an already known columns layout (for example returned from
+        ``infer_schema``).
+
+        :param validate:    if True, each record is validated against the layout and
+                            ``LinearizationError`` is raised if it does not fit. The layout
+                            is never modified.
+        """
+        writer.start()
+        self._write_header(writer, columns)
+        if self.executor is not None:
+            payload = self._worker_payload(columns.options, columns)
+            for chunk, rows in self._map_chunks(_output_chunk, data, payload, validate):
+                for d, row in zip(chunk, rows):
+                    writer.write_row(row, d)
+        else:
+            plan = columns.compile()
+            pending = []
+            for d in data:
+                if validate:
+                    errors = self._check(columns, d, validate=True)
+                    if errors:
+                        raise LinearizationError(errors)
+                self._write_row(writer, plan, d, pending)
+            if pending:
+                self._flush_rows(writer, plan, pending)
+        writer.finish()
+
     def reset(self):
         self.conv = None
 
+    def _write_row(self, writer, plan, d, pending):
+        """
+        Outputs the record and writes the row. If the plan has batch translated columns,
+        the rows are collected in pending and written in chunks of ``chunk_size`` rows
+        """
+        row = plan.output(d)
+        if not plan.has_batches:
+            writer.write_row(row, d)
+            return
+        pending.append((row, d))
+        if len(pending) >= self.chunk_size:
+            self._flush_rows(writer, plan, pending)
+
+    @staticmethod
+    def _flush_rows(writer, plan, pending):
+        plan.translate_batches()
+        for row, d in pending:
+            writer.write_row(row, d)
+        pending.clear()
+
+    def _check(self, columns, d, validate=False):
+        """
+        Checks (or validates, if validate is True) the record against the columns,
+        skipping records with a known shape if shape cache is enabled
+        """
+        cache = self.shape_cache
+        if cache is None:
+            return columns.validate(d) if validate else columns.check(d)
+        cache.bind(columns)
+        fp = fingerprint(d)
+        if cache.seen(fp):
+            return []
+        errors = columns.validate(d) if validate else columns.check(d)
+        if not (validate and errors):
+            # after check the layout has been extended so that the record fits
+            cache.add(fp)
+        return errors
+
+    def _worker_payload(self, options, columns=None):
+        """
+        Returns the options and the columns layout as passed to the chunk tasks. For
+        executors other than thread pools they are pickled here once, together with
+        a token under which the workers keep them unpickled (see ``_load_payload``) -
+        so the layout is neither pickled nor compiled again for every chunk.
+        """
+        if isinstance(self.executor, ThreadPoolExecutor):
+            return None, (options, columns)
+        dumped = columns.dump() if columns is not None else None
+        return uuid.uuid4().hex, pickle.dumps((options, dumped), pickle.HIGHEST_PROTOCOL)
+
+    def _map_chunks(self, func, data, *args):
+        """
+        Calls ``func(*args, chunk)`` on the executor for chunks of data, keeping at most
+        ``max_pending_chunks`` chunks in flight
+
+        :return: generator of (chunk, result) in the order of the chunks
+        """
+        pending = deque()
+        it = iter(data)
+        while True:
+            chunk = list(islice(it, self.chunk_size))
+            if not chunk:
+                break
+            pending.append((chunk, self.executor.submit(func, *args, chunk)))
+            if len(pending) >= self.max_pending_chunks:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+
     @staticmethod
     def _write_header(writer, columns):
+        writer.layout_changed(columns)
         depth = columns.depth
         for d in range(depth):
             writer.write_header(columns.get_header_row(d))
+
+
+#: the number of payloads (see ``Converter._worker_payload``) kept in a worker process
+MAX_WORKER_PAYLOADS = 4
+
+#: token => (options, columns) of the recent conversions, unpickled in this process
+_worker_payloads = OrderedDict()
+
+
+def _load_payload(payload):
+    """
+    Returns the options and the columns layout of a payload created by
+    ``Converter._worker_payload``, unpickling them only once per process
+    """
+    token, data = payload
+    if token is None:
+        return data
+    loaded = _worker_payloads.get(token)
+    if loaded is None:
+        options, dumped = pickle.loads(data)
+        columns = Columns.load(dumped, options=options) if dumped is not None else None
+        loaded = _worker_payloads[token] = (options, columns)
+        while len(_worker_payloads) > MAX_WORKER_PAYLOADS:
+            _worker_payloads.popitem(last=False)
+    return loaded
+
+
+def _infer_chunk(payload, chunk):
+    options, _ = _load_payload(payload)
+    columns = Columns(options=options)
+    for d in chunk:
+        columns.check(d)
+    return columns
+
+
+def _output_chunk(payload, validate, chunk):
+    _, columns = _load_payload(payload)
+    # the plan keeps the values of batch translated columns, so each chunk needs its own
+    plan = columns.compile()
+    rows = []
+    for d in chunk:
+        if validate:
+            errors = columns.validate(d)
+            if errors:
+                raise LinearizationError(errors)
+        rows.append(plan.output(d))
+    plan.translate_batches()
+    return rows
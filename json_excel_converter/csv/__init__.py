@@ -1,39 +1,118 @@
 import csv
 from io import StringIO
+from operator import itemgetter
 
 from json_excel_converter import Writer as bWriter
+from json_excel_converter.buffer import SpillFile
+from json_excel_converter.linearize import LayoutCache, Row, padding_template
 
 
 class Writer(bWriter):
-    def __init__(self, file=None):
+    #: the maximum number of cached padding templates
+    max_templates = 4096
+
+    def __init__(self, file=None, batch_size=1000, buffer_size=-1, reproject=False,
+                 tmpdir=None):
+        """
+        :param file:        file name or a file-like object. StringIO if None
+        :param batch_size:  the number of rows collected and written at once
+        :param buffer_size: the buffering of the file opened from a file name,
+                            as in ``open``. Default buffering if -1
+        :param reproject:   if True, the rows are kept in a temporary file together with
+                            the version of the columns layout they were output with and
+                            written in ``finish``. When a record widens the layout, the
+                            conversion is not restarted - the kept rows are re-projected
+                            to the final layout by inserting empty cells.
+        :param tmpdir:      directory for the temporary file, system default if None
+        """
         super().__init__()
         if file is None:
             file = StringIO()
         self.file = file
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        self.reproject = reproject
+        self.tmpdir = tmpdir
+        self.versions = []      # slots of the layouts the rows were output with
+        self.headers = []
+        self.spool = None
         self.fd = None
         self.csv = None
+        self.pending = []
+        self.templates = LayoutCache(padding_template, self.max_templates)
 
     def start(self):
         if isinstance(self.file, str):
-            self.fd = open(self.file, 'w')
+            self.fd = open(self.file, 'w', buffering=self.buffer_size)
         else:
             self.fd = self.file
         self.csv = csv.writer(self.fd)
+        self.pending = []
+        self.templates.clear()
+        self.clear_spool()
+
+    @property
+    def supports_widening(self):
+        return self.reproject
 
     def reset(self):
+        self.pending = []
+        self.clear_spool()
         self.fd.seek(0)
         self.fd.truncate()
 
+    def clear_spool(self):
+        self.versions = []
+        self.headers = []
+        if self.spool is not None:
+            self.spool.close()
+        self.spool = SpillFile(tmpdir=self.tmpdir) if self.reproject else None
+
     def finish(self):
+        if self.reproject:
+            self.write_spool()
+        self.flush()
         self.fd.flush()
         if isinstance(self.file, str):
             self.fd.close()
         self.fd = None
 
+    def flush(self):
+        """
+        Writes out the collected rows
+        """
+        if self.pending:
+            self.csv.writerows(self.pending)
+            self.pending = []
+
+    def layout_changed(self, columns):
+        if self.reproject:
+            self.versions.append(columns.slots())
+            self.headers = []
+
     def write_header(self, header):
+        if self.reproject:
+            # only the header of the final layout is written
+            self.headers.append(self.cells(header))
+            return
         self.write_row(header, None)
 
     def write_row(self, row, data):
+        if self.reproject:
+            self.spool.append((len(self.versions) - 1, self.cells(row)))
+            return
+        self.pending.append(self.cells(row))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def cells(self, row):
+        """
+        Returns the cells of the row, with empty cells for the padding of multi-column values
+        """
+        if isinstance(row, Row):
+            # csv writes None as an empty string, so the values can be used as they are
+            template = self.templates(row.layout)
+            return row.values if template is None else template(row.values + [''])
         out = []
         for h in row:
             v = h.value
@@ -43,4 +122,43 @@ class Writer(bWriter):
             if h.columns > 1:
                 for _ in range(h.columns - 1):
                     out.append('')
-        self.csv.writerow(out)
+        return out
+
+    def write_spool(self):
+        """
+        Writes the header of the last layout and the kept rows, re-projected to the last layout
+        """
+        self.pending.extend(self.headers)
+        projections = [self.projection(slots) for slots in self.versions]
+        for version, cells in self.spool:
+            projection = projections[version] if version >= 0 else None
+            self.pending.append(cells if projection is None else projection(list(cells) + ['']))
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+        self.spool.close()
+        self.spool = None
+
+    def projection(self, slots):
+        """
+        Returns a function that takes the cells of a row output with a layout of the given
+        slots, followed by an empty string, and returns the cells in the last layout.
+        None if the layout is the last one.
+        """
+        last = self.versions[-1]
+        if slots is last:
+            return None
+        position = {slot: idx for idx, slot in enumerate(slots)}
+        padding = len(slots)
+        indices = [position.get(slot, padding) for slot in last]
+        mapped = set(indices)
+        for idx, slot in enumerate(slots):
+            if idx in mapped:
+                continue
+            # the column has got children since, its cell goes to the first of them
+            for new_idx, new_slot in enumerate(last):
+                if new_slot[:len(slot)] == slot and indices[new_idx] == padding:
+                    indices[new_idx] = idx
+                    break
+        if len(indices) < 2:
+            return lambda cells: [cells[idx] for idx in indices]
+        return itemgetter(*indices)
@@ -1,9 +1,16 @@
 from collections import OrderedDict
+from collections.abc import Sequence
+from operator import itemgetter
 
 from .options import Options
 
+#: the maximum number of distinct key sets whose order is cached in Columns
+KEY_ORDER_CACHE_SIZE = 1024
+
 
 class Value:
+    __slots__ = ('value', 'columns', 'span', 'path', 'has_children', 'url')
+
     def __init__(self, value, columns=1, span=1, path=None, has_children=False, url=None):
         self.value = value
         self.columns = columns
@@ -30,10 +37,88 @@ class LinearizationError(Exception):
     """
 
     def __init__(self, errors):
-        super().__init__()
+        super().__init__(errors)
         self.errors = errors
 
 
+#: types of json primitive values, containers holding only these are fingerprinted
+#: without visiting their items one by one
+PRIMITIVE_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def fingerprint(value):
+    """
+    Returns a cheap hashable fingerprint of the shape of a json value: the keys of dicts
+    (in their order), the lengths of arrays and the set of their item shapes, and the types
+    of primitive values (so None is told apart from other values). Values with the same
+    fingerprint either both fit or both do not fit into a columns layout. Only containers
+    holding other containers are walked item by item in python.
+    """
+    if isinstance(value, dict):
+        types = tuple(map(type, value.values()))
+        if PRIMITIVE_TYPES.issuperset(types):
+            return tuple(value), types
+        return tuple(value), tuple(map(fingerprint, value.values()))
+    if isinstance(value, (list, tuple)):
+        # the items are checked independently of their position, so arrays of the same
+        # length with the same item shapes are equal
+        types = frozenset(map(type, value))
+        if PRIMITIVE_TYPES.issuperset(types):
+            return len(value), types
+        return len(value), frozenset(map(fingerprint, value))
+    return type(value)
+
+
+class ShapeCache:
+    """
+    A bounded LRU cache of fingerprints (see ``fingerprint``) of records that are known
+    to fit into a columns layout. Records with a known fingerprint do not need to be checked.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.fingerprints = OrderedDict()
+        self.columns = None
+        self.hits = 0
+        self.misses = 0
+
+    def bind(self, columns):
+        """
+        Associates the cache with a columns layout, dropping the fingerprints if the layout
+        differs from the previous one
+        """
+        if columns is not self.columns:
+            self.fingerprints.clear()
+            self.columns = columns
+
+    def seen(self, fp):
+        """
+        Returns True if a record with this fingerprint is known to fit into the layout
+        """
+        if fp in self.fingerprints:
+            self.fingerprints.move_to_end(fp)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add(self, fp):
+        self.fingerprints[fp] = True
+        if len(self.fingerprints) > self.maxsize:
+            self.fingerprints.popitem(last=False)
+
+    def clear(self):
+        self.fingerprints.clear()
+        self.columns = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
 class Column:
     def __init__(self, parent, name, path, cardinality, options):
         """
@@ -48,9 +133,41 @@ class Column:
         self.parent = parent
         self.name = name
         self.options = options
-        self.cardinality = cardinality
-        self.children = None  # an instance of Columns class
+        self._cardinality = cardinality
+        self._children = None  # an instance of Columns class
+        self._columns_taken = None
+        self._depth = None
         self.path = path
+        self.has_values = False  # True if check has seen a primitive (not None) value
+
+    @property
+    def cardinality(self):
+        return self._cardinality
+
+    @cardinality.setter
+    def cardinality(self, value):
+        if value != self._cardinality:
+            self._cardinality = value
+            self.invalidate()
+
+    @property
+    def children(self):
+        return self._children
+
+    @children.setter
+    def children(self, value):
+        self._children = value
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Drops the cached columns_taken and depth of this column and all its ancestors.
+        Called whenever the layout below this column changes.
+        """
+        self._columns_taken = None
+        self._depth = None
+        if self.parent is not None:
+            self.parent.invalidate()
 
     def check(self, value):
         """
@@ -66,9 +183,34 @@ class Column:
                 errors.extend(self.check(array_value))
         elif isinstance(value, dict):
             if not self.children:
-                self.children = Columns(path=self.path, options=self.options)
+                self.children = Columns(path=self.path, options=self.options, parent=self)
                 errors.append(('nochildren', self.path, value))
             errors.extend(self.children.check(value))
+        elif value is not None:
+            if self.children:
+                raise ValueError(
+                    'Inconsistent JSON: %s: sometimes a primitive is used, sometimes a dict. '
+                    'Value %s, previous dict %s' % (self.path, value, self.children.columns))
+            self.has_values = True
+        return errors
+
+    def validate(self, value):
+        """
+        Returns a list of errors, in the same format as ``check``, but does not modify
+        this column if the value does not fit into it
+        :param value: a value to be validated against this column
+        """
+        errors = []
+        if isinstance(value, (list, tuple)):
+            if len(value) > self.cardinality:
+                errors.append(('cardinality', self.path, self.cardinality, len(value)))
+            for array_value in value:
+                errors.extend(self.validate(array_value))
+        elif isinstance(value, dict):
+            if self.children is None:
+                errors.append(('nochildren', self.path, value))
+            else:
+                errors.extend(self.children.validate(value))
         elif value is not None:
             if self.children:
                 raise ValueError(
@@ -76,6 +218,33 @@ class Column:
                     'Value %s, previous dict %s' % (self.path, value, self.children.columns))
         return errors
 
+    def dump(self):
+        """
+        Returns a json-serializable representation of this column, see ``Columns.dump``
+        """
+        return [self.name, self.cardinality,
+                self.children.dump() if self.children is not None else None]
+
+    def merge(self, other):
+        """
+        Merges a column inferred from other data into this column - takes the maximum
+        of the cardinalities and the union of the children. The other data are considered
+        to follow the data of this column, so as in ``check``, ValueError is raised if
+        this column has children and the other one has seen primitive values.
+
+        :param other:   an instance of Column with the same path
+        """
+        if self.children and other.has_values:
+            raise ValueError(
+                'Inconsistent JSON: %s: sometimes a primitive is used, sometimes a dict. '
+                'Previous dict %s' % (self.path, self.children.columns))
+        self.has_values = self.has_values or other.has_values
+        self.cardinality = max(self.cardinality, other.cardinality)
+        if other.children is not None:
+            if self.children is None:
+                self.children = Columns(path=self.path, options=self.options, parent=self)
+            self.children.merge(other.children)
+
     def empty(self, already_output=0):
         """
         return empty cells that this column (with subcolumns) take
@@ -86,29 +255,53 @@ class Column:
         if self.cardinality > already_output:
             return Value('', (self.cardinality - already_output) * self.columns_taken)
 
-    def output(self, value, data, index=0):
+    def output(self, value, data, index=0, url_cache=None):
         """
         Output the value
         :param value:
+        :param url_cache:   a dict of urls already computed for this record, keyed by options
         :return:
         """
         if isinstance(value, (list, tuple)):
             # output the values from the array
             for idx, v in enumerate(value):
-                yield from self.output(v, data, idx)
+                yield from self.output(v, data, idx, url_cache)
             # output any extra empty space if more items are allocated
             if len(value) < self.cardinality:
                 yield self.empty(already_output=len(value))
         elif isinstance(value, dict):
-            yield from self.children.output(value, data)
+            yield from self.children.output(value, data, url_cache)
         else:
             # otherwise it is a primitive value, so just return it
             yield Value(
-                self.options.value_translator(value, self.path, index, self.cardinality),
+                self.translate(value, index),
                 path=self.path, columns=self.columns_taken,
-                url=self.options.url(data)
+                url=self.url(data, url_cache)
             )
 
+    def translate(self, value, index):
+        """
+        Translates a single primitive value via the value translator of the options
+        """
+        if self.options.batch_value_translator is not None:
+            return self.options.batch_value_translator(
+                [value], self.path, index, self.cardinality)[0]
+        return self.options.value_translator(value, self.path, index, self.cardinality)
+
+    def url(self, data, url_cache=None):
+        """
+        Returns the url of the cells of this column for the record, evaluating
+        ``Options.url`` at most once per record if url_cache is passed
+        """
+        url = self.options.url
+        if url is None:
+            return None
+        if url_cache is None:
+            return url(data)
+        if self.options not in url_cache:
+            url_cache[self.options] = url(data)
+        return url_cache[self.options]
+
     def get_header_row(self, level):
         """
         Returns the header row
@@ -131,37 +324,71 @@ class Column:
             for idx in range(self.cardinality):
                 yield from self.children.get_header_row(level - 1)
 
+    def slots(self):
+        """
+        Returns identifiers of the output columns taken by this column (all instances),
+        see ``Columns.slots``
+        """
+        slots = []
+        for idx in range(self.cardinality):
+            if self.children:
+                slots.extend((self.name, idx) + s for s in self.children.slots())
+            else:
+                slots.append((self.name, idx))
+        return slots
+
     @property
     def columns_taken(self):
         """
         Returns a number of columns that a single instance (i.e. cardinality=1) takes
         """
-        if not self.children:
-            return 1
-        return self.children.columns_taken
+        if self._columns_taken is None:
+            if not self.children:
+                self._columns_taken = 1
+            else:
+                self._columns_taken = self.children.columns_taken
+        return self._columns_taken
 
     @property
     def depth(self):
-        if self.children:
-            return 1 + self.children.depth
-        return 1
+        if self._depth is None:
+            if self.children:
+                self._depth = 1 + self.children.depth
+            else:
+                self._depth = 1
+        return self._depth
 
     def __repr__(self):
         return self.name
 
 
 class Columns:
-    def __init__(self, options=None, path=None):
+    def __init__(self, options=None, path=None, parent=None):
         """
         Creates a new instance, options is an instance of Options class
         :param options:
+        :param parent:  the Column these columns are children of, None for the top level
         """
         if path:
             self.path = path + '.'
         else:
             self.path = ''
+        self.parent = parent
         self.columns = OrderedDict()
         self.options = options or Options()
+        self._columns_taken = None
+        self._depth = None
+        # ordered (and filtered) keys of the records seen so far, keyed by their key set
+        self._key_order = {}
+
+    def invalidate(self):
+        """
+        Drops the cached columns_taken and depth of these columns and all their ancestors
+        """
+        self._columns_taken = None
+        self._depth = None
+        if self.parent is not None:
+            self.parent.invalidate()
 
     def check(self, value):
         """
@@ -171,31 +398,7 @@ class Columns:
         :return:   list of errors
         """
         errors = []
-        pairs = []
-        if self.options.fields:
-            pairs = [
-                (k, value[k])
-                for k in self.options.fields
-                if k in value
-            ]
-        elif self.options.excludes:
-            key_func = self.options.sort_key
-            for k in value.keys():
-                key_func(k)
-            pairs = [
-                (k, value[k])
-                for k in sorted(value.keys(), key=key_func)
-                if k not in self.options.excludes
-            ]
-        else:
-            key_func = self.options.sort_key
-            for k in value.keys():
-                key_func(k)
-            pairs = [
-                (k, value[k])
-                for k in sorted(value.keys(), key=key_func)
-            ]
-        for k, v in pairs:
+        for k, v in self._pairs(value):
             if k in self.columns:
                 errors.extend(self.columns[k].check(v))
             else:
@@ -207,28 +410,363 @@ class Columns:
                                 cardinality=child_cardinality,
                                 options=self.options[k])
                 self.columns[k] = column
+                self.invalidate()
                 column.check(v)  # do not add to errors as this subtree is a new one
         return errors
 
-    def output(self, json, data=None):
+    def validate(self, value):
+        """
+        Validates the value against the columns without modifying them
+
+        :param value:
+        :return:   list of errors, empty if the value fits into the columns
+        """
+        errors = []
+        for k, v in self._pairs(value):
+            if k in self.columns:
+                errors.extend(self.columns[k].validate(v))
+            else:
+                errors.append(('nochild', k, v))
+        return errors
+
+    def merge(self, other):
+        """
+        Merges columns inferred from other data (for example on another process or node)
+        into these columns. The cardinalities are maximized and the children unified
+        recursively. New columns are appended in the order of the other columns, as
+        ``check`` appends them - so columns inferred from consecutive chunks of data and
+        merged in the order of the chunks are the same as columns inferred from all the data.
+
+        :param other:   an instance of Columns, not modified
+        :return:        self
+        """
+        for k, other_column in other.columns.items():
+            if k not in self.columns:
+                self.columns[k] = Column(parent=self,
+                                         path=self.path + k,
+                                         name=k,
+                                         cardinality=self.options[k].cardinality,
+                                         options=self.options[k])
+                self.invalidate()
+            self.columns[k].merge(other_column)
+        return self
+
+    def _pairs(self, value):
+        if self.options.fields:
+            return [
+                (k, value[k])
+                for k in self.options.fields
+                if k in value
+            ]
+        key_set = frozenset(value)
+        keys = self._key_order.get(key_set)
+        if keys is None:
+            keys = self._order_keys(value)
+            if len(self._key_order) >= KEY_ORDER_CACHE_SIZE:
+                self._key_order.clear()
+            self._key_order[key_set] = keys
+        return [(k, value[k]) for k in keys]
+
+    def _order_keys(self, value):
+        key_func = self.options.sort_key
+        for k in value.keys():
+            key_func(k)
+        if self.options.excludes:
+            return [
+                k for k in sorted(value.keys(), key=key_func)
+                if k not in self.options.excludes
+            ]
+        return sorted(value.keys(), key=key_func)
+
+    def dump(self):
+        """
+        Returns a compact json-serializable representation of the columns layout:
+        a list of ``[name, cardinality, children]`` triplets in the output order, where
+        children is either None for primitive columns or a nested list of the same format
+        """
+        return [c.dump() for c in self.columns.values()]
+
+    @classmethod
+    def load(cls, dumped, options=None, path=None, parent=None):
+        """
+        Creates columns layout from the output of ``dump``. The dump does not record whether
+        primitive values have been seen in the columns, so ``merge`` can not detect
+        primitive/dict conflicts on loaded columns.
+
+        :param dumped:  the output of ``dump``
+        :param options: an instance of Options class
+        """
+        columns = cls(options=options, path=path, parent=parent)
+        for name, cardinality, children in dumped:
+            column = Column(parent=columns,
+                            path=columns.path + name,
+                            name=name,
+                            cardinality=cardinality,
+                            options=columns.options[name])
+            if children is not None:
+                column.children = cls.load(children, options=column.options,
+                                           path=column.path, parent=column)
+            columns.columns[name] = column
+        return columns
+
+    def output(self, json, data=None, url_cache=None):
         if data is None:
             data = json
+        if url_cache is None:
+            url_cache = {}
         for k, column in self.columns.items():
             if k not in json:
                 yield column.empty()
             else:
-                yield from column.output(json[k], data)
+                yield from column.output(json[k], data, url_cache=url_cache)
 
     @property
     def depth(self):
-        if self.columns:
-            return max(c.depth for c in self.columns.values())
-        return 0
+        if self._depth is None:
+            if self.columns:
+                self._depth = max(c.depth for c in self.columns.values())
+            else:
+                self._depth = 0
+        return self._depth
 
     def get_header_row(self, level):
         for c in self.columns.values():
             yield from c.get_header_row(level)
 
+    def slots(self):
+        """
+        Returns a list with an identifier of each output column - a tuple of keys and array
+        indices leading to the column, for example ``('a', 1, 'b', 0)`` for the first
+        value of ``b`` in the second item of ``a``. A column keeps its identifier when
+        the layout is widened, unless it gets children.
+        """
+        slots = []
+        for c in self.columns.values():
+            slots.extend(c.slots())
+        return slots
+
     @property
     def columns_taken(self):
-        return sum(c.columns_taken * c.cardinality for c in self.columns.values())
+        if self._columns_taken is None:
+            self._columns_taken = sum(c.columns_taken * c.cardinality
+                                      for c in self.columns.values())
+        return self._columns_taken
+
+    def compile(self):
+        """
+        Compiles the columns layout into a flat extraction plan. The plan outputs
+        the same values as ``output`` but does not walk the tree for every record.
+        The layout (and the options) must not change after it has been compiled.
+
+        :return: an instance of CompiledColumns
+        """
+        return CompiledColumns(self)
+
+
+class Row:
+    """
+    A compact representation of an output row. The cell values are kept in a single list,
+    the paths and widths of the cells are kept in ``layout``, a tuple of (path, columns)
+    pairs shared by all the rows of the same shape. Urls, if any, are kept in a dict
+    keyed by the cell index.
+
+    Iterating the row yields Value instances, so writers that need them can use rows as
+    lists of values. Writers that do not need them can read ``values`` and ``layout``
+    directly without creating per-cell objects.
+    """
+    __slots__ = ('values', 'layout', 'urls')
+
+    def __init__(self, values, layout, urls=None):
+        self.values = values
+        self.layout = layout
+        self.urls = urls
+
+    def __iter__(self):
+        urls = self.urls or {}
+        for idx, (value, (path, columns)) in enumerate(zip(self.values, self.layout)):
+            yield Value(value, columns, path=path, url=urls.get(idx))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __eq__(self, other):
+        if not isinstance(other, (Row, Sequence)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class LayoutCache:
+    """
+    A bounded cache of values computed from row layouts (see ``Row``), for example
+    ``padding_template`` or ``layout_width``. Rows of the same shape share the layout
+    tuple, so the values are cached by the identity of the layout.
+    """
+
+    def __init__(self, func, maxsize=4096):
+        """
+        :param func:    a function computing the value from a layout
+        :param maxsize: the number of cached layouts, the cache is cleared when exceeded
+        """
+        self.func = func
+        self.maxsize = maxsize
+        self.values = {}    # id(layout) => (layout, value)
+        self.last_layout = None
+        self.last_value = None
+
+    def __call__(self, layout):
+        if layout is self.last_layout:
+            return self.last_value
+        cached = self.values.get(id(layout))
+        if cached is None:
+            if len(self.values) >= self.maxsize:
+                self.values.clear()
+            # the layout is kept in the cache so that its id is not reused
+            cached = self.values[id(layout)] = (layout, self.func(layout))
+        self.last_layout = layout
+        self.last_value = cached[1]
+        return self.last_value
+
+    def __len__(self):
+        return len(self.values)
+
+    def clear(self):
+        self.values = {}
+        self.last_layout = None
+        self.last_value = None
+
+
+def padding_template(layout):
+    """
+    Returns a function that takes the values of a row with the layout followed by an empty
+    string and returns the cells of the row with the padding of multi-column cells,
+    or None if the layout has no padding
+    """
+    indices = []
+    padding = len(layout)   # index of the empty string appended to the values
+    for idx, (_, columns) in enumerate(layout):
+        indices.append(idx)
+        indices.extend([padding] * (columns - 1))
+    return itemgetter(*indices) if len(indices) > len(layout) else None
+
+
+def layout_width(layout):
+    """
+    Returns the number of columns taken by a row with the layout
+    """
+    return sum(columns for _, columns in layout)
+
+
+class CompiledColumns:
+    """
+    A precomputed extraction plan of a Columns instance. For each column, the plan
+    contains the key, the width of the padding when the key is missing and the emitter
+    of its values. Column widths, translators and urls are resolved when the plan is built,
+    cells are collected into flat lists without generators and returned as a Row.
+
+    Values of columns with ``Options.batch_value_translator`` are output untranslated
+    and collected; ``translate_batches`` translates all the collected values of each column
+    at once and updates the rows output since the previous call.
+    """
+
+    #: the maximum number of distinct row layouts shared between the output rows
+    max_layouts = 4096
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.columns_taken = columns.columns_taken
+        self.batches = []
+        self.plan = self._compile_columns(columns)
+        self.layouts = {}
+
+    @property
+    def has_batches(self):
+        """
+        True if some columns are translated by ``translate_batches``
+        """
+        return bool(self.batches)
+
+    def output(self, json, data=None):
+        """
+        Outputs the json as a Row, see ``Columns.output``
+        """
+        if data is None:
+            data = json
+        values = []
+        layout = []
+        urls = {}
+        self._emit(self.plan, json, data, values, layout, urls, {})
+        layout = tuple(layout)
+        shared_layout = self.layouts.get(layout)
+        if shared_layout is None:
+            if len(self.layouts) >= self.max_layouts:
+                self.layouts.clear()
+            self.layouts[layout] = shared_layout = layout
+        return Row(values, shared_layout, urls or None)
+
+    def translate_batches(self):
+        """
+        Translates the values collected for batch translated columns since the last call
+        and stores the translated values in the rows they were output to
+        """
+        for translator, path, cardinality, pending in self.batches:
+            for index, cells in pending.items():
+                translated = translator([value for _, _, value in cells],
+                                        path, index, cardinality)
+                for (values, pos, _), value in zip(cells, translated):
+                    values[pos] = value
+            pending.clear()
+
+    @staticmethod
+    def _emit(plan, json, data, values, layout, urls, url_cache):
+        for key, missing, emit in plan:
+            if key in json:
+                emit(json[key], data, values, layout, urls, url_cache, 0)
+            elif missing:
+                values.append('')
+                layout.append((None, missing))
+
+    def _compile_columns(self, columns):
+        return [
+            (key, column.cardinality * column.columns_taken, self._compile_column(column))
+            for key, column in columns.columns.items()
+        ]
+
+    def _compile_column(self, column):
+        path = column.path
+        cardinality = column.cardinality
+        columns_taken = column.columns_taken
+        value_translator = column.options.value_translator
+        batch_translator = column.options.batch_value_translator
+        url = column.url if column.options.url is not None else None
+        emit_children = self._emit
+        children_plan = self._compile_columns(column.children) if column.children else None
+        cell_layout = (path, columns_taken)
+        pending = {}  # array index => list of (row values, position, untranslated value)
+        if batch_translator is not None:
+            self.batches.append((batch_translator, path, cardinality, pending))
+
+        def emit(value, data, values, layout, urls, url_cache, index):
+            if isinstance(value, (list, tuple)):
+                for idx, v in enumerate(value):
+                    emit(v, data, values, layout, urls, url_cache, idx)
+                if len(value) < cardinality:
+                    values.append('')
+                    layout.append((None, (cardinality - len(value)) * columns_taken))
+            elif isinstance(value, dict):
+                emit_children(children_plan, value, data, values, layout, urls, url_cache)
+            else:
+                if url is not None:
+                    cell_url = url(data, url_cache)
+                    if cell_url is not None:
+                        urls[len(values)] = cell_url
+                if batch_translator is not None:
+                    pending.setdefault(index, []).append((values, len(values), value))
+                    values.append(value)
+                else:
+                    values.append(value_translator(value, path, index, cardinality))
+                layout.append(cell_layout)
+
+        return emit
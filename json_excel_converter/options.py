@@ -1,3 +1,11 @@
+def default_header_translator(header, path, index, cardinality):
+    return header
+
+
+def default_value_translator(value, path, index, cardinality):
+    return value
+
+
 class Options:
 
     def __init__(self, cardinality=1,
@@ -6,7 +14,8 @@ class Options:
                  header_translator=None,
                  value_translator=None,
                  parent=None,
-                 url=None):
+                 url=None,
+                 batch_value_translator=None):
         self.children = {}
         self.cardinality = cardinality
         self.ordering = ordering
@@ -15,13 +24,19 @@ class Options:
         self.excludes = excludes or set()
         self.header_translator = header_translator or (
             parent.header_translator if parent else
-            (lambda header, path, index, cardinality: header)
+            default_header_translator
         )
         self.value_translator = value_translator or (
             parent.value_translator if parent else
-            (lambda value, path, index, cardinality: value)
+            default_value_translator
+        )
+        self.url = url  # None or a function that gets the record and returns url
+        # None or a function(values, path, index, cardinality) that translates a list of values
+        # of one column at once and returns a sequence of the translated values. If set, it is
+        # used instead of value_translator
+        self.batch_value_translator = batch_value_translator or (
+            parent.batch_value_translator if parent and not value_translator else None
         )
-        self.url = url or (lambda data: None)
 
     def __getitem__(self, item):
         if item in self.children:
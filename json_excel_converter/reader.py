@@ -0,0 +1,430 @@
+import csv
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+from .sources import FileSource
+
+NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+MERGE_CELL = re.compile(rb'<(?:\w+:)?mergeCell\b[^>]*?\bref="([A-Z]+)(\d+):([A-Z]+)(\d+)"')
+
+
+class HeaderLayout:
+    """
+    Columns of a table parsed from its header rows, as laid out by
+    ``Columns.get_header_row``: a name is written in the first cell of the columns it
+    spans (the other cells are empty or merged), names of array items are repeated and
+    a column without children leaves the cells below it empty.
+    """
+
+    def __init__(self, header_rows, arrays=()):
+        """
+        :param header_rows: a list of header rows, each a list of cell values
+        :param arrays:      dotted paths of the columns that are always read as arrays,
+                            even if the header has only one item of them
+        """
+        width = max((len(r) for r in header_rows), default=0)
+        rows = [[_header_name(v) for v in r] + [''] * (width - len(r)) for r in header_rows]
+        counts = {}     # (parent path, name) => number of items
+        columns = []    # (column index, path of (name, item index))
+        previous = ()
+        for col in range(width):
+            path = []
+            for level, row in enumerate(rows):
+                name = row[col]
+                has_children = any(r[col] for r in rows[level + 1:])
+                if name:
+                    parent = tuple(path)
+                    key = (parent, name)
+                    counts[key] = counts.get(key, 0) + 1
+                    path.append((name, counts[key] - 1))
+                elif has_children and len(previous) > level and \
+                        tuple(previous[:level]) == tuple(path):
+                    # the name is in the first column of the parent, merged or left empty
+                    path.append(previous[level])
+                else:
+                    break
+                if not has_children:
+                    break
+            if path:
+                columns.append((col, tuple(path)))
+            previous = path
+        array_paths = set(arrays)
+        self.arrays = set()    # (parent path, name) of the array columns
+        for (parent, name), count in counts.items():
+            dotted = '.'.join([n for n, _ in parent] + [name])
+            if count > 1 or dotted in array_paths:
+                self.arrays.add((parent, name))
+        self.columns = columns
+
+    def paths(self):
+        """
+        Returns the list of (column index, dotted path with item indices of arrays)
+        """
+        ret = []
+        for col, path in self.columns:
+            parts = []
+            for idx, (name, item) in enumerate(path):
+                if (path[:idx], name) in self.arrays:
+                    parts.append('%s[%s]' % (name, item))
+                else:
+                    parts.append(name)
+            ret.append((col, '.'.join(parts)))
+        return ret
+
+    def compile(self):
+        """
+        Returns a function that builds a record from a data row. Empty cells are left out,
+        trailing empty array items are dropped and other empty items are None.
+        """
+        plan = []
+        for col, path in self.columns:
+            steps = tuple(
+                (name, item if (path[:idx], name) in self.arrays else None)
+                for idx, (name, item) in enumerate(path)
+            )
+            plan.append((col, steps[:-1], steps[-1]))
+
+        def build(row):
+            record = {}
+            size = len(row)
+            for col, parents, (name, item) in plan:
+                if col >= size:
+                    continue
+                value = row[col]
+                if value is None or value == '':
+                    continue
+                container = record
+                for parent_name, parent_item in parents:
+                    if parent_item is None:
+                        child = container.get(parent_name)
+                        if child is None:
+                            child = container[parent_name] = {}
+                    else:
+                        items = container.get(parent_name)
+                        if items is None:
+                            items = container[parent_name] = []
+                        if len(items) <= parent_item:
+                            items.extend([None] * (parent_item + 1 - len(items)))
+                        child = items[parent_item]
+                        if child is None:
+                            child = items[parent_item] = {}
+                    container = child
+                if item is None:
+                    container[name] = value
+                else:
+                    items = container.get(name)
+                    if items is None:
+                        items = container[name] = []
+                    if len(items) <= item:
+                        items.extend([None] * (item + 1 - len(items)))
+                    items[item] = value
+            return record
+
+        return build
+
+
+class TableReader:
+    """
+    Mixin of the readers rebuilding json records from a table written by the converter
+    """
+
+    def records(self, rows, header_rows):
+        """
+        Reads the header from the rows iterator and yields a record for each data row.
+        Empty rows are skipped, the table starts at the first non-empty cell of the first
+        non-empty row.
+        """
+        rows = (r for r in rows if any(v is not None and v != '' for v in r))
+        header = []
+        for row in rows:
+            header.append(row)
+            if len(header) >= header_rows:
+                break
+        if not header:
+            return
+        start_col = next(idx for idx, v in enumerate(header[0]) if v is not None and v != '')
+        self.layout = HeaderLayout([r[start_col:] for r in header], self.arrays)
+        build = self.layout.compile()
+        for row in rows:
+            record = build(row[start_col:] if start_col else row)
+            if record:
+                yield record
+
+
+class CSVReader(TableReader, FileSource):
+    """
+    Records of a CSV file written by ``json_excel_converter.csv.Writer``. The values are
+    read as strings, empty cells are left out of the records.
+    """
+    newline = ''
+
+    def __init__(self, file, encoding='utf-8', header_rows=1, arrays=(), **fmtparams):
+        """
+        :param file:        file name or a text file object opened with ``newline=''``
+        :param header_rows: the number of header rows, the depth of the columns layout
+        :param arrays:      dotted paths of the columns that are always read as arrays,
+                            even if the header has only one item of them
+        :param fmtparams:   the format parameters passed to ``csv.reader``
+        """
+        super().__init__(file, encoding)
+        self.header_rows = header_rows
+        self.arrays = arrays
+        self.fmtparams = fmtparams
+        self.layout = None
+
+    def parse(self, f):
+        return self.records(csv.reader(f, **self.fmtparams), self.header_rows)
+
+
+class XLSXReader(TableReader):
+    """
+    Records of an xlsx sheet written by ``json_excel_converter.xlsx.Writer`` (or any other
+    xlsx writer). The sheet XML is parsed incrementally and each row is discarded once
+    its record is built, so the memory taken does not grow with the number of rows - only
+    the shared strings table is kept in memory.
+
+    Numbers are read as int if they have no fractional part, booleans as bool, other cells
+    as strings. Dates are read as the numbers excel stores them as.
+
+    If ``header_rows`` is not set, the number of header rows is detected from the merged
+    cells: a column without children at the top level is merged over all the header rows
+    and a header of a column with children is merged over its child columns. If neither
+    is present (for example if all the top level columns are objects with a single key),
+    pass ``header_rows`` explicitly.
+    """
+
+    def __init__(self, file, sheet=None, header_rows=None, arrays=()):
+        """
+        :param file:        file name or a binary file object
+        :param sheet:       name or index of the sheet, the first sheet if None
+        :param header_rows: the number of header rows, detected from merged cells if None
+        :param arrays:      dotted paths of the columns that are always read as arrays,
+                            even if the header has only one item of them
+        """
+        self.file = file
+        self.sheet = sheet
+        self.header_rows = header_rows
+        self.arrays = arrays
+        self.layout = None
+        if isinstance(file, str):
+            self.position = None
+        else:
+            self.position = file.tell()
+
+    def __iter__(self):
+        if self.position is not None:
+            self.file.seek(self.position)
+        with zipfile.ZipFile(self.file) as z:
+            path = self.sheet_path(z)
+            strings = self.shared_strings(z)
+            header_rows = self.header_rows
+            merges = None
+            if header_rows is None:
+                merges = self.merges(z, path)
+            with z.open(path) as f:
+                rows = self.rows(f, strings)
+                if header_rows is None:
+                    rows, header_rows = self.detect_header_rows(rows, merges)
+                yield from self.records(rows, header_rows)
+
+    def sheet_path(self, z):
+        """
+        Returns the path of the sheet XML in the zip file
+        """
+        with z.open('xl/workbook.xml') as f:
+            sheets = [
+                (el.get('name'), el.get(REL_NS + 'id'))
+                for _, el in iterparse(f) if el.tag == NS + 'sheet'
+            ]
+        if self.sheet is None:
+            idx = 0
+        elif isinstance(self.sheet, int):
+            idx = self.sheet
+        else:
+            names = [name for name, _ in sheets]
+            if self.sheet not in names:
+                raise KeyError('Sheet %r not found, the workbook has sheets %s'
+                               % (self.sheet, ', '.join(names)))
+            idx = names.index(self.sheet)
+        rel_id = sheets[idx][1]
+        with z.open('xl/_rels/workbook.xml.rels') as f:
+            for _, el in iterparse(f):
+                if el.tag == PACKAGE_REL_NS + 'Relationship' and el.get('Id') == rel_id:
+                    target = el.get('Target')
+                    if target.startswith('/'):
+                        return target[1:]
+                    return 'xl/' + target
+        raise KeyError('Sheet %r not found in the workbook relationships' % rel_id)
+
+    @staticmethod
+    def shared_strings(z):
+        """
+        Returns the list of shared strings
+        """
+        if 'xl/sharedStrings.xml' not in z.namelist():
+            return []
+        strings = []
+        with z.open('xl/sharedStrings.xml') as f:
+            for _, el in iterparse(f):
+                if el.tag == NS + 'si':
+                    strings.append(_text(el))
+                    el.clear()
+        return strings
+
+    @staticmethod
+    def merges(z, path, chunk_size=1024 * 1024):
+        """
+        Returns a list of merged ranges (first row, first col, last row, last col), 0-based.
+        The merged cells are listed after the rows, the sheet XML is scanned for them
+        without parsing it.
+        """
+        merges = []
+        tail = b''
+        with z.open(path) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                buf = tail + chunk
+                last = 0
+                for m in MERGE_CELL.finditer(buf):
+                    merges.append((int(m.group(2)) - 1, _column_index(m.group(1).decode()),
+                                   int(m.group(4)) - 1, _column_index(m.group(3).decode())))
+                    last = m.end()
+                if not chunk:
+                    return merges
+                # keep the end of the buffer, a merged range might continue in the next chunk
+                tail = buf[max(last, len(buf) - 256):]
+
+    @staticmethod
+    def rows(f, strings):
+        """
+        Yields the rows of the sheet XML as lists of cell values. Empty rows between
+        the rows are yielded as empty lists.
+        """
+        sheet_data = None
+        row_idx = 0
+        for event, el in iterparse(f, events=('start', 'end')):
+            tag = el.tag
+            if event == 'start':
+                if tag == NS + 'sheetData':
+                    sheet_data = el
+                continue
+            if tag != NS + 'row':
+                continue
+            number = el.get('r')
+            if number is not None:
+                number = int(number) - 1
+                while row_idx < number:
+                    yield []
+                    row_idx += 1
+            values = []
+            for c in el.iter(NS + 'c'):
+                ref = c.get('r')
+                if ref is not None:
+                    col = _column_index(ref.rstrip('0123456789'))
+                    if col > len(values):
+                        values.extend([None] * (col - len(values)))
+                values.append(_cell_value(c, strings))
+            # the rows already read are not needed any more
+            sheet_data.clear()
+            row_idx += 1
+            yield values
+
+    @staticmethod
+    def detect_header_rows(rows, merges):
+        """
+        Detects the number of header rows from the merged ranges
+
+        :return: a tuple of (rows iterator, number of header rows)
+        """
+        buffered = []
+        for row in rows:
+            buffered.append(row)
+            if any(v is not None and v != '' for v in row):
+                break
+        if not buffered:
+            return iter(()), 1
+        top = len(buffered) - 1
+        depth = 1
+        level = 0
+        while level < depth:
+            while len(buffered) <= top + level:
+                row = next(rows, None)
+                if row is None:
+                    break
+                buffered.append(row)
+            if len(buffered) <= top + level:
+                break
+            row = buffered[top + level]
+            for first_row, first_col, last_row, last_col in merges:
+                if first_row != top + level:
+                    continue
+                if not level and last_row > first_row:
+                    # a top level column without children spans all the header rows
+                    depth = max(depth, last_row - first_row + 1)
+                value = row[first_col] if first_col < len(row) else None
+                if last_col > first_col and value is not None and value != '':
+                    # a column with children, they are on the next header row
+                    depth = max(depth, level + 2)
+            level += 1
+
+        def chained():
+            yield from buffered
+            yield from rows
+
+        return chained(), depth
+
+
+def _header_name(value):
+    if value is None:
+        return ''
+    return str(value)
+
+
+def _text(el):
+    """
+    Returns the text of a string item - the t element or the t elements of its runs,
+    phonetic runs are left out
+    """
+    t = el.find(NS + 't')
+    if t is not None:
+        return t.text or ''
+    return ''.join(t.text or '' for r in el.iter(NS + 'r') for t in r.iter(NS + 't'))
+
+
+def _cell_value(c, strings):
+    cell_type = c.get('t')
+    if cell_type == 'inlineStr':
+        el = c.find(NS + 'is')
+        return _text(el) if el is not None else None
+    v = c.find(NS + 'v')
+    if v is None or v.text is None:
+        return None
+    text = v.text
+    if cell_type == 's':
+        return strings[int(text)]
+    if cell_type == 'b':
+        return text == '1'
+    if cell_type in ('str', 'e'):
+        return text
+    try:
+        return int(text)
+    except ValueError:
+        value = float(text)
+        return int(value) if value.is_integer() and abs(value) < 2 ** 53 else value
+
+
+_column_indices = {}
+
+
+def _column_index(letters):
+    idx = _column_indices.get(letters)
+    if idx is None:
+        idx = 0
+        for ch in letters:
+            idx = idx * 26 + ord(ch) - ord('A') + 1
+        idx = _column_indices[letters] = idx - 1
+    return idx
@@ -0,0 +1,61 @@
+import json
+
+from .linearize import Columns
+from .options import EMPTY_OPTIONS
+
+SCHEMA_VERSION = 1
+
+
+def save_schema(columns, file):
+    """
+    Saves the columns layout (for example returned from ``Converter.infer_schema``)
+    to a compact json file
+
+    :param columns: an instance of Columns
+    :param file:    file name or a file-like object opened for writing text
+    """
+    serialized = {
+        'version': SCHEMA_VERSION,
+        'columns': columns.dump()
+    }
+    if isinstance(file, str):
+        with open(file, 'w') as f:
+            json.dump(serialized, f, separators=(',', ':'))
+    else:
+        json.dump(serialized, file, separators=(',', ':'))
+
+
+def load_schema(file, options=EMPTY_OPTIONS):
+    """
+    Loads the columns layout saved by ``save_schema``
+
+    :param file:    file name or a file-like object opened for reading text
+    :param options: an instance of Options class that will be used for the loaded columns
+    :return:        an instance of Columns
+    """
+    if isinstance(file, str):
+        with open(file) as f:
+            serialized = json.load(f)
+    else:
+        serialized = json.load(file)
+    if serialized.get('version') != SCHEMA_VERSION:
+        raise ValueError('Unsupported schema version %s' % serialized.get('version'))
+    return Columns.load(serialized['columns'], options=options)
+
+
+def merge_schemas(schemas, options=EMPTY_OPTIONS):
+    """
+    Merges columns layouts inferred independently on disjoint parts of the data,
+    for example on several nodes, into a single layout. See ``Columns.merge``.
+
+    :param schemas: iterable of Columns instances or files saved by ``save_schema``,
+                    in the order of the data they were inferred from
+    :param options: an instance of Options class used for the merged layout
+    :return:        an instance of Columns
+    """
+    merged = Columns(options=options)
+    for schema in schemas:
+        if not isinstance(schema, Columns):
+            schema = load_schema(schema, options)
+        merged.merge(schema)
+    return merged
@@ -0,0 +1,149 @@
+import json
+import re
+
+#: characters of a json number running up to the end of the buffer
+NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+
+
+class FileSource:
+    """
+    Base class of iterables of records parsed lazily from a file. Every iteration reads
+    the file from the start again - a file name is reopened, a file object is seeked back
+    to the position it had when the source was created - so the records are never kept
+    in memory and the source can be passed to ``Converter.convert``, which iterates it
+    again on restarts.
+    """
+    #: the newline argument of ``open`` for file names
+    newline = None
+
+    def __init__(self, file, encoding='utf-8'):
+        """
+        :param file:        file name or a text file object. A file object that is not
+                            seekable can be iterated only once.
+        :param encoding:    encoding of the file opened from a file name
+        """
+        self.file = file
+        self.encoding = encoding
+        self.iterated = False
+        if isinstance(file, str) or not file.seekable():
+            self.position = None
+        else:
+            self.position = file.tell()
+
+    def __iter__(self):
+        if isinstance(self.file, str):
+            with open(self.file, encoding=self.encoding, newline=self.newline) as f:
+                yield from self.parse(f)
+        else:
+            if self.position is not None:
+                self.file.seek(self.position)
+            elif self.iterated:
+                raise ValueError('The file is not seekable and can be iterated only once, '
+                                 'pass iter(source) to Converter.convert')
+            self.iterated = True
+            yield from self.parse(self.file)
+
+    def parse(self, f):
+        """
+        Returns an iterator of records read from the text file
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+
+class JSONLinesSource(FileSource):
+    """
+    Records of a JSON lines file - one json document per line, empty lines are skipped
+    """
+
+    def parse(self, f):
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ValueError('Invalid json on line %s: %s' % (line_no, e)) from e
+
+
+class JSONArraySource(FileSource):
+    """
+    Items of a top-level json array, parsed incrementally - only the currently parsed
+    item and a chunk of the file read ahead are kept in memory
+    """
+
+    def __init__(self, file, encoding='utf-8', chunk_size=65536):
+        """
+        :param chunk_size:  the number of characters read from the file at once
+        """
+        super().__init__(file, encoding)
+        self.chunk_size = chunk_size
+
+    def parse(self, f):
+        decoder = json.JSONDecoder()
+        buf = ''
+        pos = 0
+        eof = False
+
+        def fill():
+            nonlocal buf, pos, eof
+            # read at least as much as is buffered so that a long item is not re-parsed
+            # too many times
+            chunk = f.read(max(self.chunk_size, len(buf) - pos))
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def skip_whitespace():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        skip_whitespace()
+        if buf[pos:pos + 1] != '[':
+            raise ValueError('Expected a json array at character %s' % pos)
+        pos += 1
+        skip_whitespace()
+        if buf[pos:pos + 1] == ']':
+            return
+        while True:
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    if eof:
+                        raise
+                    fill()
+                    continue
+                if not eof and isinstance(item, (int, float)) and \
+                        not isinstance(item, bool) and NUMBER_TAIL.match(buf, end):
+                    # the number might continue in the next chunk - it might also have been
+                    # cut off after ".", "e", "+" or "-", which the decoder leaves out
+                    fill()
+                    continue
+                break
+            pos = end
+            yield item
+            skip_whitespace()
+            separator = buf[pos:pos + 1]
+            pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError('Expected "," or "]" after an array item, got %r' % separator)
+            skip_whitespace()
+
+
+def open_source(file, encoding='utf-8'):
+    """
+    Returns a JSONLinesSource for ``.jsonl`` and ``.ndjson`` file names,
+    JSONArraySource otherwise
+    """
+    if isinstance(file, str) and file.lower().endswith(('.jsonl', '.ndjson')):
+        return JSONLinesSource(file, encoding=encoding)
+    return JSONArraySource(file, encoding=encoding)
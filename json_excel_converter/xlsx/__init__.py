@@ -1,57 +1,140 @@
 import json
+import shutil
+import tempfile
+from collections import deque
 
 import xlsxwriter
 
 from json_excel_converter import Writer as bWriter
+from json_excel_converter.buffer import RowBuffer
+from json_excel_converter.linearize import Row
 
 
 class Formatter:
     def __init__(self, formats):
-        self.workbook = None
+        self._workbook = None
         self.formats = formats
-        self.format_cache = {}
+        self.dynamic_formats = [f for f in formats if not getattr(f, 'static', False)]
+        self.format_cache = {}      # cell position (+ keys of dynamic formats) => format
+        self.properties_cache = {}  # format properties => format
+
+    @property
+    def workbook(self):
+        return self._workbook
+
+    @workbook.setter
+    def workbook(self, workbook):
+        if workbook is not self._workbook:
+            # formats belong to a workbook, can not be reused in another one
+            self.format_cache = {}
+            self.properties_cache = {}
+        self._workbook = workbook
 
     def format(self, cell_data, rowidx, colidx, first, last):
+        key = (colidx, first, last)
+        if self.dynamic_formats:
+            key += tuple(
+                self._dynamic_key(f, cell_data, rowidx, colidx, first, last)
+                for f in self.dynamic_formats
+            )
+        fmt = self.format_cache.get(key)
+        if fmt is None:
+            fmt = self.format_cache[key] = self._create_format(
+                cell_data, rowidx, colidx, first, last)
+        return fmt
+
+    @property
+    def needs_cell_data(self):
+        """
+        True if a format depends on the cell data or row index, i.e. the format
+        can not be resolved from the column and first/last flags only
+        """
+        return bool(self.dynamic_formats)
+
+    def _create_format(self, cell_data, rowidx, colidx, first, last):
         fmt = {}
         for format in self.formats:
             fmt.update(format.data_format(cell_data, rowidx, colidx, first, last))
-        strfmt = json.dumps(fmt, sort_keys=True)
-        if strfmt in self.format_cache:
-            return self.format_cache[strfmt]
-        fmt = self.workbook.add_format(fmt)
-        self.format_cache[strfmt] = fmt
-        return fmt
+        key = _properties_key(fmt)
+        if key not in self.properties_cache:
+            self.properties_cache[key] = self.workbook.add_format(fmt)
+        return self.properties_cache[key]
+
+    @staticmethod
+    def _dynamic_key(format, cell_data, rowidx, colidx, first, last):
+        format_key = getattr(format, 'format_key', None)
+        if format_key is not None:
+            return format_key(cell_data, rowidx, colidx, first, last)
+        return _properties_key(format.data_format(cell_data, rowidx, colidx, first, last))
+
+
+def _properties_key(properties):
+    try:
+        key = tuple(sorted(properties.items()))
+        hash(key)
+        return key
+    except TypeError:
+        # unhashable or not comparable property values
+        return json.dumps(properties, sort_keys=True)
 
 
 class Token:
+    def __init__(self, name):
+        self.name = name
+
     def __eq__(self, other):
         return self is other
 
     def __hash__(self):
         return id(self)
 
+    def __reduce__(self):
+        # unpickled as the module-level singleton, so that the identity checks still work
+        return self.name
+
 
-DEFAULT_COLUMN_WIDTH = Token()
-DEFAULT_ROW_HEIGHT = Token()
+DEFAULT_COLUMN_WIDTH = Token('DEFAULT_COLUMN_WIDTH')
+DEFAULT_ROW_HEIGHT = Token('DEFAULT_ROW_HEIGHT')
+
+#: the maximum number of rows of an excel sheet
+MAX_SHEET_ROWS = 1048576
 
 
 class Writer(bWriter):
     """
     XLSXWriter can not reset the sheet, so all the data are cached and written out on "finish"
+
+    If the rows have been spilled to disk by the row buffer (and the writer creates
+    the workbook), they are written in order to a ``constant_memory`` workbook the same way
+    ``StreamingWriter`` writes them, so that the peak memory does not depend on the number
+    of rows.
     """
 
     def __init__(self, file=None, workbook=None, sheet=None,
                  sheet_name=None, start_row=1, start_col=0,
                  header_formats=(), data_formats=(),
-                 column_widths=None, row_heights=None):
+                 column_widths=None, row_heights=None, row_buffer=None, max_rows=None,
+                 max_interned_strings=1000):
+        """
+        :param row_buffer:  an instance of RowBuffer the rows are kept in until ``finish``,
+                            for example ``SpillingRowBuffer`` to move them to disk
+                            when there are too many of them. In-memory RowBuffer if None.
+        :param max_rows:    the maximum number of data rows in a sheet. The following rows
+                            are written to new sheets, each with the header rows repeated.
+                            If None, a new sheet is started when the excel row limit
+                            is reached.
+        :param max_interned_strings:    the number of distinct strings per column that are
+                            interned - repeated values of a column then share a single string
+                            object in the buffered rows. Strings of a column with more
+                            distinct values are kept as they are. 0 disables interning.
+        """
         super().__init__()
         self.file = file
         self.workbook = workbook
         self.sheet = sheet
         self.sheet_name = sheet_name
         self.headers = []
-        self.rows = []
-        self.raw = []
+        self.rows = row_buffer if row_buffer is not None else RowBuffer()
         self.current_row = start_row
         self.start_row = start_row
         self.start_col = start_col
@@ -59,38 +142,134 @@ class Writer(bWriter):
         self.data_formatter = Formatter(data_formats)
         self.column_widths = column_widths or {}
         self.row_heights = row_heights or {}
+        self.max_rows = max_rows
+        self.max_interned_strings = max_interned_strings
+        self.interned_strings = {}  # column path => {string: string}
+        self.top_row = 0        # the row the header rows start at in each sheet
+        self.sheet_count = 0
+        self.data_column_formats = {}   # (first, last) => list of formats indexed by column
+        self.current_row_formats = None
+        self.constant_memory = False    # True if the rows are written in order
+        self.workbook_tmpdir = None
+        self.pending_header_cells = {}  # row => [(col, tcol, format)] of merged header cells
+        self.covered_header_cells = {}  # col => tcol of the cells merged from above
 
     def start(self):
         self.headers = []
-        self.rows = []
-        self.raw = []
+        self.rows.clear()
         self.current_row = 0
+        self.data_column_formats = {}
+        self.interned_strings = {}
 
     def reset(self):
         self.headers = []
-        self.rows = []
-        self.raw = []
+        self.rows.clear()
+        self.remove_workbook_tmpdir()
 
     def finish(self):
         close = not self.sheet
+        first_sheet = self.sheet
         if not self.sheet:
-            self.workbook = xlsxwriter.Workbook(self.file)
+            self.constant_memory = self.rows.spilled
+            self.workbook = self.create_workbook()
             self.sheet = self.workbook.add_worksheet(self.sheet_name)
         self.header_formatter.workbook = self.workbook
         self.data_formatter.workbook = self.workbook
+        self.sheet_count = 1
+        self.top_row = self.current_row
         self.before_write()
+        self.output_header_rows()
+        row_count = len(self.rows)
+        rows_per_sheet = self.rows_per_sheet()
+        sheet_start = 0
+        for row_idx, (r, raw) in enumerate(self.rows):
+            if row_idx - sheet_start == rows_per_sheet:
+                self.finish_sheet()
+                self.add_sheet()
+                self.output_header_rows()
+                sheet_start = row_idx
+            self.output_row(r, row_idx, first=row_idx == sheet_start,
+                            last=row_idx == min(row_count, sheet_start + rows_per_sheet) - 1,
+                            raw=raw)
+        self.finish_sheet()
+        self.after_write()
+
+        if close:
+            try:
+                self.workbook.close()
+            finally:
+                self.remove_workbook_tmpdir()
+        else:
+            self.sheet = first_sheet
+
+    def create_workbook(self):
+        if not self.constant_memory:
+            return xlsxwriter.Workbook(self.file)
+        # the rows are flushed to temporary files that xlsxwriter removes only when
+        # the workbook is closed, they are kept in a directory removed in reset
+        self.workbook_tmpdir = tempfile.mkdtemp()
+        return xlsxwriter.Workbook(self.file, {'constant_memory': True,
+                                               'tmpdir': self.workbook_tmpdir})
+
+    def remove_workbook_tmpdir(self):
+        if self.workbook_tmpdir is not None:
+            shutil.rmtree(self.workbook_tmpdir, ignore_errors=True)
+            self.workbook_tmpdir = None
+
+    def output_header_rows(self):
         self.before_headers()
         for header_idx, h in enumerate(self.headers):
             self.output_header_row(h, header_idx)
         self.after_headers()
         self.before_rows()
-        for row_idx, r in enumerate(self.rows):
-            self.output_row(r, row_idx, first=not row_idx,
-                            last=row_idx == len(self.rows) - 1,
-                            raw=self.raw[row_idx])
+
+    def finish_sheet(self):
         self.after_rows()
-        self.after_write()
+        self.set_column_widths()
+        if not self.constant_memory:
+            # in constant_memory mode the heights are set as the rows are written
+            self.set_row_heights()
+
+    def rows_per_sheet(self):
+        """
+        Returns the number of data rows written to a sheet before a new one is added
+        """
+        available = MAX_SHEET_ROWS - self.top_row - len(self.headers)
+        if self.max_rows:
+            return min(self.max_rows, available)
+        return available
+
+    def add_sheet(self):
+        """
+        Adds a new sheet for the rows that do not fit into the previous one. Its name is
+        ``sheet_name`` followed by the sheet number, or the xlsxwriter's default name.
+        """
+        self.sheet_count += 1
+        name = None
+        if self.sheet_name:
+            suffix = ' (%s)' % self.sheet_count
+            # excel limits sheet names to 31 characters
+            name = self.sheet_name[:31 - len(suffix)] + suffix
+        self.sheet = self.workbook.add_worksheet(name)
+        self.current_row = self.top_row
+        self.pending_header_cells = {}
+
+    def set_row_height(self, row_idx):
+        height = self.row_heights.get(row_idx, self.row_heights.get(DEFAULT_ROW_HEIGHT))
+        if height is not None:
+            self.sheet.set_row(row_idx, height)
 
+    def set_row_heights(self):
+        if DEFAULT_ROW_HEIGHT in self.row_heights:
+            for row_idx in range(self.current_row):
+                self.sheet.set_row(row_idx, self.row_heights[DEFAULT_ROW_HEIGHT])
+
+        for row_idx, height in self.row_heights.items():
+            if row_idx is DEFAULT_ROW_HEIGHT:
+                continue
+            self.sheet.set_row(row_idx, height)
+
+    def set_column_widths(self):
         if DEFAULT_COLUMN_WIDTH in self.column_widths:
             max_col = 0
             for header in self.headers:
@@ -110,18 +289,6 @@ class Writer(bWriter):
                                           self.column_widths[cell.path])
                 col += cell.columns
 
-        if DEFAULT_ROW_HEIGHT in self.row_heights:
-            for row_idx in range(self.current_row):
-                self.sheet.set_row(row_idx, self.row_heights[DEFAULT_ROW_HEIGHT])
-
-        for row_idx, height in self.row_heights.items():
-            if row_idx is DEFAULT_ROW_HEIGHT:
-                continue
-            self.sheet.set_row(row_idx, height)
-
-        if close:
-            self.workbook.close()
-
     def before_write(self):
         # might be overwritten by descendants
         pass
@@ -147,6 +314,9 @@ class Writer(bWriter):
         pass
 
     def output_header_row(self, header, header_idx):
+        if self.constant_memory:
+            self.set_row_height(self.current_row)
+            self.output_covered_header_cells()
         col = self.start_col
         for idx, h in enumerate(header):
             if h.has_children:
@@ -159,12 +329,53 @@ class Writer(bWriter):
         self.current_row += 1
 
     def output_header_cell(self, col, cell_data, span, header_idx, first, last):
+        if self.constant_memory:
+            if col in self.covered_header_cells:
+                # the cell is a part of a range merged from the header rows above
+                return col + cell_data.columns
+            if span > 1:
+                return self.output_merged_header_cell(col, cell_data, span, header_idx,
+                                                      first, last)
         cell_data.span = span
         return self.output_cell(
             col, cell_data,
             self.header_formatter.format(cell_data, header_idx, col, first, last), data=None)
 
+    def output_merged_header_cell(self, col, cell_data, span, header_idx, first, last):
+        """
+        Writes a header cell spanning several header rows in constant_memory mode, where
+        rows are written in order: the value in this row, formatted blank cells in the rows
+        below (see ``output_covered_header_cells``). The merged range is appended
+        to the sheet's ``merge`` list directly - ``merge_range`` writes the blank cells
+        of all the rows at once, which constant_memory mode does not allow for more than
+        one range per row. ``merge`` is not a public xlsxwriter API, the supported
+        xlsxwriter versions are pinned in the package dependencies.
+        """
+        cell_data.span = span
+        cell_format = self.header_formatter.format(cell_data, header_idx, col, first, last)
+        tcol = col + cell_data.columns - 1
+        self.sheet.write(self.current_row, col, cell_data.value, cell_format)
+        for c in range(col + 1, tcol + 1):
+            self.sheet.write_blank(self.current_row, c, None, cell_format)
+        for row in range(self.current_row + 1, self.current_row + span):
+            self.pending_header_cells.setdefault(row, []).append((col, tcol, cell_format))
+        self.sheet.merge.append([self.current_row, col, self.current_row + span - 1, tcol])
+        return tcol + 1
+
+    def output_covered_header_cells(self):
+        """
+        Writes the blank cells of the current row merged with header cells above
+        """
+        self.covered_header_cells = {}
+        for col, tcol, cell_format in self.pending_header_cells.pop(self.current_row, ()):
+            for c in range(col, tcol + 1):
+                self.sheet.write_blank(self.current_row, c, None, cell_format)
+            self.covered_header_cells[col] = tcol
+
     def output_row(self, row, row_idx, first, last, raw):
+        if self.constant_memory:
+            self.set_row_height(self.current_row)
+        self.current_row_formats = self.column_formats(first, last)
         col = self.start_col
         for r in row:
             col = self.output_row_cell(col, r, row_idx, first, last, raw)
@@ -172,10 +383,42 @@ class Writer(bWriter):
 
     def output_row_cell(self, col, cell_data, row_idx, first, last, raw):
         return self.output_cell(col, cell_data,
-                                self.data_formatter.format(cell_data, row_idx, col, first, last),
+                                self.data_format(cell_data, row_idx, col, first, last),
                                 raw)
 
+    def column_formats(self, first, last):
+        """
+        Returns a list of data formats indexed by column (relative to start_col), shared
+        by all rows with the same first/last flags, or None if the data formats depend
+        on the cell data and have to be resolved for each cell
+        """
+        if self.data_formatter.needs_cell_data:
+            return None
+        key = (first, last)
+        formats = self.data_column_formats.get(key)
+        if formats is None:
+            formats = self.data_column_formats[key] = []
+        return formats
+
+    def data_format(self, cell_data, row_idx, col, first, last):
+        formats = self.current_row_formats
+        if formats is None:
+            return self.data_formatter.format(cell_data, row_idx, col, first, last)
+        idx = col - self.start_col
+        while len(formats) <= idx:
+            # the formats are static, so they are resolved only once per column
+            formats.append(self.data_formatter.format(
+                cell_data, row_idx, self.start_col + len(formats), first, last))
+        return formats[idx]
+
     def output_cell(self, col, cell_data, cell_format, data):
+        if self.constant_memory and cell_data.span == 1 and cell_data.columns > 1 \
+                and cell_data.value == '':
+            # empty padding is not merged, so that the sheet does not accumulate
+            # per-row merge information
+            for c in range(col, col + cell_data.columns):
+                self.sheet.write_blank(self.current_row, c, None, cell_format)
+            return col + cell_data.columns
         if cell_data.columns > 1 or cell_data.span > 1:
             self.write_cell_range(self.current_row, col,
                                   self.current_row + cell_data.span - 1,
@@ -200,5 +443,243 @@ class Writer(bWriter):
         self.headers.append((list(header)))
 
     def write_row(self, row, data):
-        self.rows.append((list(row)))
-        self.raw.append(data)
+        row = row if isinstance(row, Row) else list(row)
+        if self.max_interned_strings:
+            self.intern_strings(row)
+        self.rows.append(row, data)
+
+    def intern_strings(self, row):
+        """
+        Replaces string values of the row with equal strings already seen in the same column
+        """
+        tables = self.interned_strings
+        limit = self.max_interned_strings
+        if isinstance(row, Row):
+            values = row.values
+            layout = row.layout
+            for idx, value in enumerate(values):
+                if type(value) is str:
+                    path = layout[idx][0]
+                    table = tables.get(path)
+                    if table is None:
+                        table = tables[path] = {}
+                    interned = table.get(value)
+                    if interned is not None:
+                        values[idx] = interned
+                    elif len(table) < limit:
+                        table[value] = value
+            return
+        for cell in row:
+            if type(cell.value) is str:
+                table = tables.get(cell.path)
+                if table is None:
+                    table = tables[cell.path] = {}
+                interned = table.get(cell.value)
+                if interned is not None:
+                    cell.value = interned
+                elif len(table) < limit:
+                    table[cell.value] = cell.value
+
+
+class StreamingWriter(Writer):
+    """
+    Writes the rows to the sheet as they arrive, using xlsxwriter's ``constant_memory`` mode.
+    Only the header rows and a single pending row are kept in memory.
+
+    Rows that have been written can not be discarded, so this writer does not support
+    restarts - use it with a known columns layout (``Converter(schema=...)``) or let
+    the converter infer the layout in a separate pass (done automatically by
+    ``Converter.convert``).
+
+    Rows are written in order, so leaf header cells spanning several header rows are
+    written as a value in the top row and formatted blank cells below (see
+    ``Writer.output_merged_header_cell``). Empty padding in data rows is written
+    as formatted blank cells rather than merged ranges.
+    """
+    supports_restart = False
+
+    def __init__(self, file=None, workbook=None, sheet=None, **kwargs):
+        super().__init__(file=file, workbook=workbook, sheet=sheet, **kwargs)
+        self.constant_memory = True
+        self.close_workbook = False
+        self.headers_output = False
+        self.pending_row = None
+        self.pending_raw = None
+        self.row_idx = 0
+        self.sheet_rows = 0
+
+    def start(self):
+        super().start()
+        self.close_workbook = not self.sheet
+        if not self.sheet:
+            self.workbook = self.create_workbook()
+            self.sheet = self.workbook.add_worksheet(self.sheet_name)
+        self.header_formatter.workbook = self.workbook
+        self.data_formatter.workbook = self.workbook
+        self.headers_output = False
+        self.pending_row = None
+        self.pending_raw = None
+        self.row_idx = 0
+        self.sheet_rows = 0
+        self.pending_header_cells = {}
+        self.covered_header_cells = {}
+
+    def reset(self):
+        super().reset()
+        if self.close_workbook:
+            # rows already flushed to the temporary files are dropped together with
+            # the workbook, the output file is not created
+            self.workbook = None
+            self.sheet = None
+        self.close_workbook = False
+        self.headers_output = False
+        self.pending_row = None
+        self.pending_raw = None
+
+    def write_header(self, header):
+        if self.headers_output:
+            raise RuntimeError('Can not write a header after the rows have been written')
+        super().write_header(header)
+
+    def write_row(self, row, data):
+        self.output_headers()
+        if self.pending_row is not None:
+            last = self.sheet_rows + 1 == self.rows_per_sheet()
+            self.output_row(self.pending_row, self.row_idx, first=not self.sheet_rows,
+                            last=last, raw=self.pending_raw)
+            self.row_idx += 1
+            self.sheet_rows += 1
+            if last:
+                # the row is written to a new sheet
+                self.after_rows()
+                self.add_sheet()
+                self.output_sheet_headers()
+                self.sheet_rows = 0
+        self.pending_row = row if isinstance(row, Row) else list(row)
+        self.pending_raw = data
+
+    def finish(self):
+        self.output_headers()
+        if self.pending_row is not None:
+            self.output_row(self.pending_row, self.row_idx, first=not self.sheet_rows,
+                            last=True, raw=self.pending_raw)
+            self.pending_row = None
+            self.pending_raw = None
+        self.after_rows()
+        self.after_write()
+        if self.close_workbook:
+            try:
+                self.workbook.close()
+            finally:
+                self.remove_workbook_tmpdir()
+
+    def output_headers(self):
+        if self.headers_output:
+            return
+        self.headers_output = True
+        self.top_row = self.current_row
+        self.sheet_count = 1
+        self.before_write()
+        self.output_sheet_headers()
+
+    def output_sheet_headers(self):
+        self.output_header_rows()
+        self.set_column_widths()
+
+
+class ShardedWriter(bWriter):
+    """
+    Splits the rows into workbook files of at most ``max_rows`` data rows each, every file
+    with the header rows repeated. A shard is written by a ``writer_class`` instance
+    as soon as it is full, on the executor if one is passed - with a process pool
+    the shards are generated in parallel.
+
+    Shards that have been submitted can not be taken back, so this writer does not support
+    restarts (``Converter.convert`` infers the columns layout first). The source data
+    of the rows are not passed to the shard writers.
+
+    The rows of the shards being written are kept until they are written, so at most
+    ``(max_pending_shards + 1) * max_rows`` rows are held in this process - the pending
+    shards and the shard being collected. By default a shard is pending for every worker
+    of the executor, lower ``max_rows`` to keep the peak memory down with many workers.
+    """
+    supports_restart = False
+
+    def __init__(self, file_pattern, max_rows=1000000, executor=None,
+                 writer_class=Writer, max_pending_shards=None, **writer_kwargs):
+        """
+        :param file_pattern:    name of the shard files, formatted with the shard index
+                                (starting at 1), for example ``'/tmp/export-{:03d}.xlsx'``
+        :param max_rows:        the number of data rows in a shard
+        :param executor:        ``concurrent.futures.Executor`` the shards are written on,
+                                the shards are written synchronously if None
+        :param writer_class:    the class of the shard writers, Writer by default
+        :param max_pending_shards:  the number of shards written on the executor while
+                                the rows of the next shard are collected. Submitting
+                                a shard waits for the oldest one to be written if there
+                                are more. The number of the executor's workers if None
+                                (1 if it is not known), so that all of them are busy.
+        :param writer_kwargs:   arguments passed to the shard writers (sheet_name, formats,
+                                column widths, ...). With a process pool, they must be
+                                picklable.
+        """
+        super().__init__()
+        self.file_pattern = file_pattern
+        self.max_rows = max_rows
+        self.executor = executor
+        self.writer_class = writer_class
+        if max_pending_shards is None:
+            max_pending_shards = getattr(executor, '_max_workers', None) or 1
+        self.max_pending_shards = max_pending_shards
+        self.writer_kwargs = writer_kwargs
+        self.headers = []
+        self.rows = []
+        self.pending = deque()
+        self.files = []
+
+    def start(self):
+        self.headers = []
+        self.rows = []
+        self.pending = deque()
+        self.files = []
+
+    def reset(self):
+        for future in self.pending:
+            future.cancel()
+        self.start()
+
+    def write_header(self, header):
+        self.headers.append(list(header))
+
+    def write_row(self, row, data):
+        self.rows.append(row if isinstance(row, Row) else list(row))
+        if len(self.rows) >= self.max_rows:
+            self.submit_shard()
+
+    def finish(self):
+        if self.rows or not self.files:
+            self.submit_shard()
+        while self.pending:
+            self.pending.popleft().result()
+
+    def submit_shard(self):
+        file = self.file_pattern.format(len(self.files) + 1)
+        args = (self.writer_class, self.writer_kwargs, file, self.headers, self.rows)
+        self.rows = []
+        self.files.append(file)
+        if self.executor is None:
+            _write_shard(*args)
+            return
+        self.pending.append(self.executor.submit(_write_shard, *args))
+        while len(self.pending) > self.max_pending_shards:
+            self.pending.popleft().result()
+
+
+def _write_shard(writer_class, writer_kwargs, file, headers, rows):
+    writer = writer_class(file=file, **writer_kwargs)
+    writer.start()
+    for header in headers:
+        writer.write_header(header)
+    for row in rows:
+        writer.write_row(row, None)
+    writer.finish()
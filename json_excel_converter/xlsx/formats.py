@@ -1,4 +1,20 @@
 class Format:
+    """
+    A cell format. ``data_format`` returns a dict of xlsxwriter format properties.
+
+    ``static`` formats depend only on the column and first/last flags, so their result is
+    cached per cell position. Subclasses overriding ``data_format`` are not static unless
+    they set ``static = True``. Non-static formats may define
+    ``format_key(cell_data, rowidx, colidx, first, last)`` returning a hashable key that
+    identifies the result of ``data_format`` - otherwise the result itself is used as the key.
+    """
+    static = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'data_format' in cls.__dict__ and 'static' not in cls.__dict__:
+            cls.static = False
+
     def __init__(self, fmt=None):
         self.fmt = fmt or {}
 
@@ -7,6 +23,8 @@ class Format:
 
 
 class Bold(Format):
+    static = True
+
     @classmethod
     def data_format(cls, cell_data, rowidx, colidx, first, last):
         return {
@@ -15,6 +33,8 @@ class Bold(Format):
 
 
 class Centered(Format):
+    static = True
+
     @classmethod
     def data_format(cls, cell_data, rowidx, colidx, first, last):
         return {
@@ -24,6 +44,8 @@ class Centered(Format):
 
 
 class LastUnderlined(Format):
+    static = True
+
     @classmethod
     def data_format(cls, cell_data, rowidx, colidx, first, last):
         if last:
@@ -34,6 +56,8 @@ class LastUnderlined(Format):
 
 
 class ColumnBorder(Format):
+    static = True
+
     @classmethod
     def data_format(cls, cell_data, rowidx, colidx, first, last):
         return {
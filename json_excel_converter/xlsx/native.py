@@ -0,0 +1,649 @@
+"""
+An xlsx backend that writes the workbook package (a zip of XML parts) directly, without
+xlsxwriter. Only the subset of the xlsxwriter's Workbook/Worksheet API used by the writers
+of this package is implemented.
+"""
+import os
+import re
+import zipfile
+from math import isfinite
+from numbers import Number
+
+from json_excel_converter.linearize import LayoutCache, Row, layout_width
+from json_excel_converter.xlsx import StreamingWriter
+
+_INVALID_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.%s+xml'
+
+_COLORS = {
+    'black': '000000', 'blue': '0000FF', 'brown': '800000', 'cyan': '00FFFF',
+    'gray': '808080', 'green': '008000', 'lime': '00FF00', 'magenta': 'FF00FF',
+    'navy': '000080', 'orange': 'FF6600', 'pink': 'FF00FF', 'purple': '800080',
+    'red': 'FF0000', 'silver': 'C0C0C0', 'white': 'FFFFFF', 'yellow': 'FFFF00',
+}
+
+_BORDERS = [
+    None, 'thin', 'medium', 'dashed', 'dotted', 'thick', 'double', 'hair', 'mediumDashed',
+    'dashDot', 'mediumDashDot', 'dashDotDot', 'mediumDashDotDot', 'slantDashDot'
+]
+
+_HORIZONTAL = {
+    'left': 'left', 'center': 'center', 'centre': 'center', 'right': 'right',
+    'fill': 'fill', 'justify': 'justify', 'center_across': 'centerContinuous',
+    'centre_across': 'centerContinuous', 'distributed': 'distributed',
+}
+
+_VERTICAL = {
+    'top': 'top', 'vcenter': 'center', 'vcentre': 'center', 'bottom': 'bottom',
+    'vjustify': 'justify', 'vdistributed': 'distributed',
+}
+
+
+def _escape(text):
+    if not text.isprintable():
+        text = _INVALID_CHARS.sub('', text)
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text
+
+
+def _escape_attr(text):
+    return _escape(str(text)).replace('"', '&quot;')
+
+
+def _color(color):
+    color = str(color)
+    color = _COLORS.get(color.lower(), color.lstrip('#'))
+    return 'FF' + color.upper()
+
+
+def _column_letters(col):
+    letters = ''
+    col += 1
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _inline_string(ref, style, text):
+    text = _escape(text)
+    if text[:1].isspace() or text[-1:].isspace():
+        return '<c r="%s"%s t="inlineStr"><is><t xml:space="preserve">%s</t></is></c>' % (
+            ref, style, text)
+    return '<c r="%s"%s t="inlineStr"><is><t>%s</t></is></c>' % (ref, style, text)
+
+
+def _cell(ref, style, value):
+    """
+    Returns the XML of a cell, style is either an empty string or `` s="<index>"``
+    """
+    if value is None:
+        return '<c r="%s"%s/>' % (ref, style) if style else ''
+    if value == '':
+        # as in the other writers, empty values are not written
+        return ''
+    if isinstance(value, str):
+        return _inline_string(ref, style, value)
+    if value is True or value is False:
+        return '<c r="%s"%s t="b"><v>%d</v></c>' % (ref, style, value)
+    if isinstance(value, Number) and not (isinstance(value, float) and not isfinite(value)):
+        return '<c r="%s"%s><v>%s</v></c>' % (ref, style, value)
+    return _inline_string(ref, style, str(value))
+
+
+class StyleTable:
+    """
+    Collects cell formats created via ``add_format`` (the properties are a subset of
+    xlsxwriter's format properties) and renders them as the styles part of the workbook.
+    A format is represented by its index in the table, 0 is the default format.
+    """
+
+    def __init__(self):
+        self.fonts = ['<font><sz val="11"/><color theme="1"/><name val="Calibri"/>'
+                      '<family val="2"/><scheme val="minor"/></font>']
+        self.fills = ['<fill><patternFill patternType="none"/></fill>',
+                      '<fill><patternFill patternType="gray125"/></fill>']
+        self.borders = ['<border><left/><right/><top/><bottom/><diagonal/></border>']
+        self.num_formats = {}
+        self.xfs = ['<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>']
+        self.xf_index = {self.xfs[0]: 0}
+
+    def add_format(self, properties=None):
+        properties = properties or {}
+        font_id = self._font(properties)
+        fill_id = self._fill(properties)
+        border_id = self._border(properties)
+        num_format_id = self._num_format(properties.get('num_format'))
+        alignment = self._alignment(properties)
+        attrs = 'numFmtId="%s" fontId="%s" fillId="%s" borderId="%s" xfId="0"' % (
+            num_format_id, font_id, fill_id, border_id)
+        if num_format_id:
+            attrs += ' applyNumberFormat="1"'
+        if font_id:
+            attrs += ' applyFont="1"'
+        if fill_id:
+            attrs += ' applyFill="1"'
+        if border_id:
+            attrs += ' applyBorder="1"'
+        if alignment:
+            xf = '<xf %s applyAlignment="1">%s</xf>' % (attrs, alignment)
+        else:
+            xf = '<xf %s/>' % attrs
+        if xf not in self.xf_index:
+            self.xf_index[xf] = len(self.xfs)
+            self.xfs.append(xf)
+        return self.xf_index[xf]
+
+    @staticmethod
+    def _index(items, item):
+        try:
+            return items.index(item)
+        except ValueError:
+            items.append(item)
+            return len(items) - 1
+
+    def _font(self, properties):
+        font = ''
+        if properties.get('bold'):
+            font += '<b/>'
+        if properties.get('italic'):
+            font += '<i/>'
+        if properties.get('font_strikeout'):
+            font += '<strike/>'
+        underline = properties.get('underline')
+        if underline:
+            font += '<u/>' if underline == 1 else '<u val="double"/>'
+        font_size = properties.get('font_size', properties.get('size'))
+        color = properties.get('font_color', properties.get('color'))
+        name = properties.get('font_name', properties.get('font'))
+        if not font and font_size is None and color is None and name is None:
+            return 0
+        font += '<sz val="%s"/>' % (font_size or 11)
+        font += '<color rgb="%s"/>' % _color(color) if color else '<color theme="1"/>'
+        font += '<name val="%s"/><family val="2"/>' % _escape_attr(name or 'Calibri')
+        if not name:
+            font += '<scheme val="minor"/>'
+        return self._index(self.fonts, '<font>%s</font>' % font)
+
+    def _fill(self, properties):
+        bg_color = properties.get('bg_color')
+        fg_color = properties.get('fg_color')
+        pattern = properties.get('pattern', 1 if bg_color or fg_color else 0)
+        if not pattern:
+            return 0
+        # as in xlsxwriter, a solid fill takes the background color as the foreground one
+        color = (bg_color or fg_color) if pattern == 1 else (fg_color or bg_color)
+        fill = '<patternFill patternType="solid">' if pattern == 1 else \
+            '<patternFill patternType="gray125">'
+        if color:
+            fill += '<fgColor rgb="%s"/><bgColor indexed="64"/>' % _color(color)
+        return self._index(self.fills, '<fill>%s</patternFill></fill>' % fill)
+
+    def _border(self, properties):
+        border = ''
+        for side in ('left', 'right', 'top', 'bottom'):
+            style = properties.get(side, properties.get('border'))
+            if not style:
+                border += '<%s/>' % side
+                continue
+            color = properties.get(side + '_color', properties.get('border_color'))
+            border += '<%s style="%s">%s</%s>' % (
+                side, _BORDERS[style],
+                '<color rgb="%s"/>' % _color(color) if color else '<color auto="1"/>', side)
+        if border == '<left/><right/><top/><bottom/>':
+            return 0
+        return self._index(self.borders, '<border>%s<diagonal/></border>' % border)
+
+    def _num_format(self, num_format):
+        if num_format is None:
+            return 0
+        if isinstance(num_format, int):
+            return num_format
+        if num_format not in self.num_formats:
+            self.num_formats[num_format] = 164 + len(self.num_formats)
+        return self.num_formats[num_format]
+
+    @staticmethod
+    def _alignment(properties):
+        attrs = ''
+        horizontal = _HORIZONTAL.get(properties.get('align'))
+        if horizontal:
+            attrs += ' horizontal="%s"' % horizontal
+        vertical = _VERTICAL.get(properties.get('valign'))
+        if vertical:
+            attrs += ' vertical="%s"' % vertical
+        if properties.get('text_wrap'):
+            attrs += ' wrapText="1"'
+        if properties.get('rotation'):
+            attrs += ' textRotation="%s"' % properties['rotation']
+        if properties.get('indent'):
+            attrs += ' indent="%s"' % properties['indent']
+        return '<alignment%s/>' % attrs if attrs else ''
+
+    def xml(self):
+        parts = [_XML_HEADER, '<styleSheet xmlns="%s">' % _MAIN_NS]
+        if self.num_formats:
+            parts.append('<numFmts count="%s">' % len(self.num_formats))
+            for code, num_format_id in self.num_formats.items():
+                parts.append('<numFmt numFmtId="%s" formatCode="%s"/>' % (
+                    num_format_id, _escape_attr(code)))
+            parts.append('</numFmts>')
+        for tag, items in (('fonts', self.fonts), ('fills', self.fills),
+                           ('borders', self.borders)):
+            parts.append('<%s count="%s">%s</%s>' % (tag, len(items), ''.join(items), tag))
+        parts.append('<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" '
+                     'borderId="0"/></cellStyleXfs>')
+        parts.append('<cellXfs count="%s">%s</cellXfs>' % (len(self.xfs), ''.join(self.xfs)))
+        parts.append('<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/>'
+                     '</cellStyles></styleSheet>')
+        return ''.join(parts)
+
+
+class NativeWorkbook:
+    """
+    A workbook written directly to a zip file. Sheets are written one after another,
+    adding a sheet closes the previous one.
+
+    Up to ``max_shared_strings`` distinct strings of each column are stored in the shared
+    strings table, so that repeated values are stored only once. Strings of a column with
+    more distinct values are stored inline in the cells.
+    """
+
+    def __init__(self, file, max_shared_strings=1000):
+        """
+        :param file:                file name or a binary file-like object
+        :param max_shared_strings:  the number of distinct strings of a column stored in
+                                    the shared strings table, 0 to store all strings inline
+        """
+        self.file = file
+        self.zip = zipfile.ZipFile(file, 'w', zipfile.ZIP_DEFLATED)
+        self.styles = StyleTable()
+        self.sheets = []
+        self.max_shared_strings = max_shared_strings
+        self.shared_strings = []        # the shared strings table
+        self.shared_string_index = {}   # string => index in the table
+        self.column_strings = {}        # col => {string: index in the table}
+
+    def shared_string(self, col, value):
+        """
+        Returns the index of the string in the shared strings table, or None if the string
+        is to be stored inline
+        """
+        strings = self.column_strings.get(col)
+        if strings is None:
+            strings = self.column_strings[col] = {}
+        idx = strings.get(value)
+        if idx is None and len(strings) < self.max_shared_strings:
+            idx = self.shared_string_index.get(value)
+            if idx is None:
+                idx = self.shared_string_index[value] = len(self.shared_strings)
+                self.shared_strings.append(value)
+            strings[value] = idx
+        return idx
+
+    def add_format(self, properties=None):
+        return self.styles.add_format(properties)
+
+    def add_worksheet(self, name=None):
+        if self.sheets:
+            self.sheets[-1].close()
+        name = name or 'Sheet%s' % (len(self.sheets) + 1)
+        sheet = NativeSheet(self, len(self.sheets) + 1, name)
+        self.sheets.append(sheet)
+        return sheet
+
+    def close(self):
+        if self.sheets:
+            self.sheets[-1].close()
+        sheets = ''.join('<sheet name="%s" sheetId="%s" r:id="rId%s"/>' % (
+            _escape_attr(sheet.name), sheet.index, sheet.index) for sheet in self.sheets)
+        self.write('xl/workbook.xml', '<workbook xmlns="%s" xmlns:r="%s"><sheets>%s</sheets>'
+                                      '</workbook>' % (_MAIN_NS, _REL_NS, sheets))
+        rels = [(sheet.index, _REL_NS + '/worksheet', 'worksheets/sheet%s.xml' % sheet.index)
+                for sheet in self.sheets]
+        rels.append((len(self.sheets) + 1, _REL_NS + '/styles', 'styles.xml'))
+        if self.shared_strings:
+            rels.append((len(self.sheets) + 2, _REL_NS + '/sharedStrings', 'sharedStrings.xml'))
+            self.write('xl/sharedStrings.xml', self.shared_strings_xml())
+        self.write('xl/_rels/workbook.xml.rels', _relationships(rels))
+        self.write('xl/styles.xml', self.styles.xml())
+        self.write('_rels/.rels', _relationships([(1, _REL_NS + '/officeDocument',
+                                                   'xl/workbook.xml')]))
+        overrides = ['<Override PartName="/xl/workbook.xml" ContentType="%s"/>' % (
+            _CONTENT_TYPE % 'sheet.main')]
+        overrides.extend('<Override PartName="/xl/worksheets/sheet%s.xml" ContentType="%s"/>' % (
+            sheet.index, _CONTENT_TYPE % 'worksheet') for sheet in self.sheets)
+        overrides.append('<Override PartName="/xl/styles.xml" ContentType="%s"/>' % (
+            _CONTENT_TYPE % 'styles'))
+        if self.shared_strings:
+            overrides.append('<Override PartName="/xl/sharedStrings.xml" ContentType="%s"/>' % (
+                _CONTENT_TYPE % 'sharedStrings'))
+        self.write('[Content_Types].xml', (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" '
+            'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>%s</Types>'
+        ) % ''.join(overrides))
+        self.zip.close()
+
+    def shared_strings_xml(self):
+        parts = ['<sst xmlns="%s" uniqueCount="%s">' % (_MAIN_NS, len(self.shared_strings))]
+        for text in self.shared_strings:
+            text = _escape(text)
+            if text[:1].isspace() or text[-1:].isspace():
+                parts.append('<si><t xml:space="preserve">%s</t></si>' % text)
+            else:
+                parts.append('<si><t>%s</t></si>' % text)
+        parts.append('</sst>')
+        return ''.join(parts)
+
+    def abort(self):
+        """
+        Closes the file without finishing the workbook, a file created from a name is removed
+        """
+        if self.sheets:
+            self.sheets[-1].abort()
+        self.zip.close()
+        if isinstance(self.file, str) and os.path.exists(self.file):
+            os.remove(self.file)
+
+    def write(self, name, xml):
+        if not xml.startswith(_XML_HEADER):
+            xml = _XML_HEADER + xml
+        self.zip.writestr(name, xml.encode('utf-8'))
+
+
+def _relationships(rels):
+    return '<Relationships xmlns="%s">%s</Relationships>' % (_PKG_REL_NS, ''.join(
+        '<Relationship Id="rId%s" Type="%s" Target="%s"%s/>' % (
+            rel_id, rel_type, _escape_attr(target),
+            ' TargetMode="External"' if rel_type.endswith('/hyperlink') else '')
+        for rel_id, rel_type, target in rels))
+
+
+class NativeSheet:
+    """
+    A worksheet streamed to the zip file. Rows must be written in order, cells of a row
+    in any order. Column widths must be set before ``write_head`` is called (called
+    automatically when the first rows are flushed), the rows written before are buffered.
+    """
+
+    #: the number of rows collected before they are written to the zip file
+    flush_rows = 1000
+
+    def __init__(self, workbook, index, name):
+        self.workbook = workbook
+        self.index = index
+        self.name = name
+        self.merge = []             # [first_row, first_col, last_row, last_col]
+        self.hyperlinks = []        # (row, col, url)
+        self.widths = {}            # col => width
+        self.heights = {}           # row => height, for the rows not written yet
+        self.row = None             # the row the cells are collected for
+        self.cells = {}             # col => cell xml
+        self.rows = []              # xml of the rows not yet written to the zip file
+        self.stream = None
+        self.letters = []
+
+    def ref(self, row, col):
+        letters = self.letters
+        while len(letters) <= col:
+            letters.append(_column_letters(len(letters)))
+        return '%s%s' % (letters[col], row + 1)
+
+    def set_column(self, first_col, last_col, width, cell_format=None, options=None):
+        if self.stream is not None:
+            raise RuntimeError('Column widths must be set before the rows are written')
+        for col in range(first_col, last_col + 1):
+            self.widths[col] = width
+
+    def set_row(self, row, height, cell_format=None, options=None):
+        self.heights[row] = height
+
+    def write(self, row, col, value, cell_format=None):
+        ref = self.ref(row, col)
+        style = self._style(cell_format)
+        if type(value) is str and value and self.workbook.max_shared_strings:
+            idx = self.workbook.shared_string(col, value)
+            if idx is not None:
+                self._set_cell(row, col, '<c r="%s"%s t="s"><v>%s</v></c>' % (ref, style, idx))
+                return
+        self._set_cell(row, col, _cell(ref, style, value))
+
+    def write_blank(self, row, col, blank, cell_format=None):
+        self.write(row, col, None, cell_format)
+
+    def write_url(self, row, col, url, cell_format=None, string=None, tip=None):
+        self.write(row, col, url if string is None else string, cell_format)
+        self.hyperlinks.append((row, col, url))
+
+    def merge_range(self, first_row, first_col, last_row, last_col, data, cell_format=None):
+        """
+        Writes the value to the first cell and formatted blanks to the rest of the first row.
+        Cells of the following rows are not written.
+        """
+        self.write(first_row, first_col, data, cell_format)
+        for col in range(first_col + 1, last_col + 1):
+            self.write_blank(first_row, col, None, cell_format)
+        self.merge.append([first_row, first_col, last_row, last_col])
+
+    def write_values(self, row, col, values, layout, urls, styles):
+        """
+        Writes a whole row of values at once
+
+        :param values:  the values of the cells
+        :param layout:  a list of (path, columns) of the cells, values taking more than one
+                        column are followed by blank cells
+        :param urls:    a dict of urls keyed by the index of the value, or None
+        :param styles:  a list of the style attributes (`` s="<format>"`` or an empty
+                        string) of all the columns of the row, starting at ``col``
+        """
+        if self.row is not None:
+            self._flush_row()
+        letters = self.letters
+        while len(letters) < col + len(styles):
+            letters.append(_column_letters(len(letters)))
+        r = str(row + 1)
+        shared_string = self.workbook.shared_string if self.workbook.max_shared_strings else None
+        cells = []
+        append = cells.append
+        offset = 0
+        for idx, value in enumerate(values):
+            c = col + offset
+            if type(value) is str and value:
+                string_idx = shared_string(c, value) if shared_string else None
+                if string_idx is None:
+                    append(_inline_string(letters[c] + r, styles[offset], value))
+                else:
+                    append('<c r="%s%s"%s t="s"><v>%s</v></c>' % (
+                        letters[c], r, styles[offset], string_idx))
+            else:
+                cell = _cell(letters[c] + r, styles[offset], value)
+                if cell:
+                    append(cell)
+            columns = layout[idx][1]
+            if columns > 1:
+                # padding, written as formatted blanks as in StreamingWriter
+                for blank in range(offset if value == '' else offset + 1, offset + columns):
+                    if styles[blank]:
+                        append('<c r="%s%s"%s/>' % (letters[col + blank], r, styles[blank]))
+            if urls and urls.get(idx):
+                self.hyperlinks.append((row, c, urls[idx]))
+            offset += columns
+        self._add_row(row, ''.join(cells))
+
+    def write_head(self):
+        """
+        Starts the sheet part in the zip file and writes the buffered rows
+        """
+        if self.stream is not None:
+            return
+        # a full sheet may exceed the 2 GiB limit of entries without the zip64 extension
+        self.stream = self.workbook.zip.open(
+            'xl/worksheets/sheet%s.xml' % self.index, 'w', force_zip64=True)
+        head = _XML_HEADER + '<worksheet xmlns="%s" xmlns:r="%s">' % (_MAIN_NS, _REL_NS)
+        if self.widths:
+            head += '<cols>%s</cols>' % ''.join(
+                '<col min="%s" max="%s" width="%s" customWidth="1"/>' % (
+                    first + 1, last + 1, _column_width(width))
+                for first, last, width in _ranges(self.widths))
+        self.stream.write((head + '<sheetData>').encode('utf-8'))
+        self._write_rows()
+
+    def close(self):
+        if self.row is not None:
+            self._flush_row()
+        self.write_head()
+        self._write_rows()
+        tail = '</sheetData>'
+        if self.merge:
+            tail += '<mergeCells count="%s">%s</mergeCells>' % (len(self.merge), ''.join(
+                '<mergeCell ref="%s:%s"/>' % (self.ref(r1, c1), self.ref(r2, c2))
+                for r1, c1, r2, c2 in self.merge))
+        if self.hyperlinks:
+            tail += '<hyperlinks>%s</hyperlinks>' % ''.join(
+                '<hyperlink ref="%s" r:id="rId%s"/>' % (self.ref(row, col), idx + 1)
+                for idx, (row, col, _) in enumerate(self.hyperlinks))
+        self.stream.write((tail + '</worksheet>').encode('utf-8'))
+        self.stream.close()
+        if self.hyperlinks:
+            self.workbook.write(
+                'xl/worksheets/_rels/sheet%s.xml.rels' % self.index,
+                _relationships([(idx + 1, _REL_NS + '/hyperlink', url)
+                                for idx, (_, _, url) in enumerate(self.hyperlinks)]))
+
+    def abort(self):
+        if self.stream is not None:
+            self.stream.close()
+
+    @staticmethod
+    def _style(cell_format):
+        return ' s="%s"' % cell_format if cell_format else ''
+
+    def _set_cell(self, row, col, cell):
+        if row != self.row:
+            if self.row is not None:
+                if row < self.row:
+                    raise ValueError('Rows must be written in order, row %s written after %s' %
+                                     (row, self.row))
+                self._flush_row()
+            self.row = row
+        self.cells[col] = cell
+
+    def _flush_row(self):
+        cells = self.cells
+        self._add_row(self.row, ''.join(cells[col] for col in sorted(cells)))
+        self.row = None
+        self.cells = {}
+
+    def _add_row(self, row, cells):
+        height = self.heights.pop(row, None)
+        if height is not None:
+            self.rows.append('<row r="%s" ht="%s" customHeight="1">%s</row>' % (
+                row + 1, height, cells))
+        else:
+            self.rows.append('<row r="%s">%s</row>' % (row + 1, cells))
+        if len(self.rows) >= self.flush_rows and self.stream is not None:
+            self._write_rows()
+
+    def _write_rows(self):
+        if self.rows:
+            self.stream.write(''.join(self.rows).encode('utf-8'))
+            self.rows = []
+
+
+def _ranges(widths):
+    """
+    Groups a dict of col => width into sorted (first, last, width) ranges
+    """
+    ranges = []
+    for col in sorted(widths):
+        width = widths[col]
+        if ranges and ranges[-1][1] == col - 1 and ranges[-1][2] == width:
+            ranges[-1][1] = col
+        else:
+            ranges.append([col, col, width])
+    return ranges
+
+
+def _column_width(width):
+    # the same conversion of the width in characters as in xlsxwriter
+    if width < 1:
+        return int(width * 12 + 0.5) / 12.0
+    return int((int(width * 7 + 0.5) + 5) / 7.0 * 256.0) / 256.0
+
+
+class NativeWriter(StreamingWriter):
+    """
+    A StreamingWriter that writes the xlsx file directly, without xlsxwriter. The sheet
+    XML is streamed to the zip file as the rows arrive. Up to ``max_interned_strings``
+    distinct strings of each column go to the shared strings table, the other strings
+    are stored inline in the cells. Header merges, data and header formats (a subset
+    of xlsxwriter's format properties: fonts, fills, borders, alignment and number
+    formats), column widths, row heights and urls are supported.
+
+    Rows output by the compiled columns plan are rendered directly to XML. If the cell
+    hooks (``output_row_cell``, ``output_cell``, ``write_cell``, ``data_format``) are
+    overridden, each cell goes through them as in the other writers, with ``self.sheet``
+    providing a subset of the xlsxwriter's Worksheet API.
+    """
+
+    #: the maximum number of cached row layout widths
+    max_layouts = 4096
+
+    def __init__(self, file=None, **kwargs):
+        for arg in ('workbook', 'sheet'):
+            if kwargs.get(arg) is not None:
+                raise ValueError('NativeWriter writes its own workbook, it can not write to '
+                                 'an existing "%s". Use StreamingWriter instead.' % arg)
+        super().__init__(file=file, **kwargs)
+        self.fast_rows = all(
+            getattr(type(self), hook) is getattr(NativeWriter, hook)
+            for hook in ('output_row_cell', 'output_cell', 'write_cell', 'data_format'))
+        self.style_attrs = {}       # (first, last) => style attributes of the columns
+        self.layout_widths = LayoutCache(layout_width, self.max_layouts)
+
+    def start(self):
+        super().start()
+        self.style_attrs = {}
+        self.layout_widths.clear()
+
+    def create_workbook(self):
+        return NativeWorkbook(self.file, self.max_interned_strings)
+
+    def reset(self):
+        if self.close_workbook and self.workbook is not None:
+            self.workbook.abort()
+        super().reset()
+
+    def output_sheet_headers(self):
+        super().output_sheet_headers()
+        self.sheet.write_head()
+
+    def output_row(self, row, row_idx, first, last, raw):
+        if not self.fast_rows or not isinstance(row, Row) or \
+                self.data_formatter.needs_cell_data:
+            return super().output_row(row, row_idx, first, last, raw)
+        self.set_row_height(self.current_row)
+        width = self.layout_widths(row.layout)
+        attrs = self.style_attrs.get((first, last))
+        if attrs is None or len(attrs) < width:
+            styles = self.column_formats(first, last)
+            if len(styles) < width:
+                self.current_row_formats = styles
+                self.data_format(None, row_idx, self.start_col + width - 1, first, last)
+            attrs = self.style_attrs[(first, last)] = [
+                ' s="%s"' % style if style else '' for style in styles]
+        self.sheet.write_values(self.current_row, self.start_col, row.values, row.layout,
+                                row.urls, attrs)
+        self.current_row += 1
@@ -0,0 +1,102 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from json_excel_converter import LinearizationError
+from json_excel_converter.aio import AsyncConverter, AsyncWriter, SyncWriterAdapter
+from json_excel_converter.csv import Writer
+from json_excel_converter.linearize import Columns
+
+data = [
+    {'a': ['1'], 'b': None},
+    {'a': ['1', '2'], 'b': {'x': 1}},
+    {'a': ['1', '2', '3'], 'b': {'x': 2, 'y': [3, 4]}},
+    {'b': {'y': [5]}},
+]
+
+expected = """
+a,a,a,b,,
+,,,x,y,y
+1,,,,,
+1,2,,1,,
+1,2,3,2,3,4
+,,,,5,
+""".strip()
+
+
+def run(coro):
+    # asyncio.run is new in python 3.7
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+async def records():
+    for d in data:
+        await asyncio.sleep(0)
+        yield d
+
+
+def output(w):
+    return w.file.getvalue().strip().replace('\r\n', '\n')
+
+
+def test_async_convert():
+    conv = AsyncConverter(chunk_size=2, max_resident_records=1)
+    w = Writer()
+    run(conv.convert_async(records(), w))
+    assert conv.restarts == 2
+    assert output(w) == expected
+
+    for conv, w in ((AsyncConverter(two_pass=True), Writer()),
+                    (AsyncConverter(chunk_size=3), Writer(reproject=True))):
+        run(conv.convert_async(records(), w))
+        assert conv.restarts == 0
+        assert output(w) == expected
+
+
+def test_async_writer_and_schema():
+    class ListWriter(AsyncWriter):
+        def __init__(self):
+            self.headers = []
+            self.rows = []
+
+        async def start(self):
+            self.headers = []
+            self.rows = []
+
+        async def write_header(self, header):
+            self.headers.append([h.value for h in header])
+
+        async def write_rows(self, rows):
+            self.rows.extend(list(r) for r, _ in rows)
+
+    cols = Columns()
+    for d in data:
+        cols.check(d)
+    w = ListWriter()
+    conv = AsyncConverter(schema=cols)
+    run(conv.convert_async(data, w))
+    assert w.headers[0] == ['a', 'a', 'a', 'b']
+    assert len(w.rows) == 4
+
+    with pytest.raises(LinearizationError):
+        run(conv.convert_async([{'a': ['1', '2', '3', '4']}], w))
+
+
+def test_executor():
+    with ThreadPoolExecutor(2) as executor:
+        conv = AsyncConverter(executor=executor, chunk_size=2)
+        w = Writer()
+        run(conv.convert_async(records(), w))
+        assert output(w) == expected
+
+    # the columns layout would be modified in the worker processes
+    with ProcessPoolExecutor(1) as executor:
+        with pytest.raises(ValueError):
+            AsyncConverter(executor=executor)
+        with pytest.raises(ValueError):
+            SyncWriterAdapter(Writer(), executor)
@@ -0,0 +1,107 @@
+from io import BytesIO
+
+import pytest
+
+from json_excel_converter import Converter
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from json_excel_converter.arrow import Writer, slot_names  # noqa: E402
+
+data = [
+    {'a': 1, 'b': [{'c': 'x', 'd': 2.5}, {'c': 'y'}], 'e': {'f': True}},
+    {'a': 2, 'b': [{'c': 'z'}]},
+    {'a': 3, 'g': 'new'},
+]
+
+
+def test_slot_names():
+    assert slot_names([('a', 0), ('b', 0, 'c', 0), ('b', 1, 'c', 0), ('e', 0, 'f', 0),
+                       ('h', 0), ('h', 1)]) == ['a', 'b[0].c', 'b[1].c', 'e.f', 'h[0]', 'h[1]']
+
+
+def test_parquet():
+    w = Writer(batch_size=2)
+    conv = Converter()
+    conv.convert(iter(data), w)
+    assert conv.restarts == 1
+    table = pq.read_table(BytesIO(w.file.getvalue()))
+    assert table.schema.names == ['a', 'b[0].c', 'b[0].d', 'b[1].c', 'b[1].d', 'e.f', 'g']
+    assert table.schema.field('a').type == pa.int64()
+    assert table.schema.field('b[0].d').type == pa.float64()
+    assert table.schema.field('e.f').type == pa.bool_()
+    # only nulls in the first batch
+    assert table.schema.field('g').type == pa.string()
+    assert table.num_rows == 3
+    assert pq.ParquetFile(BytesIO(w.file.getvalue())).num_row_groups == 2
+    assert table.to_pylist()[1] == {
+        'a': 2, 'b[0].c': 'z', 'b[0].d': None, 'b[1].c': None, 'b[1].d': None,
+        'e.f': None, 'g': None
+    }
+    assert table.column('g').to_pylist() == [None, None, 'new']
+
+
+def test_ipc():
+    w = Writer(format='ipc', types={'a': pa.float64()})
+    Converter(two_pass=True).convert(data, w)
+    table = pa.ipc.open_file(BytesIO(w.file.getvalue())).read_all()
+    assert table.schema.field('a').type == pa.float64()
+    assert table.column('a').to_pylist() == [1.0, 2.0, 3.0]
+    assert table.column('b[1].c').to_pylist() == ['y', None, None]
+
+
+def test_type_mismatch(tmp_path):
+    fn = str(tmp_path / 'test.parquet')
+    w = Writer(fn, batch_size=1)
+    with pytest.raises(TypeError, match="column 'a'"):
+        Converter(two_pass=True).convert([{'a': 1}, {'a': 'x'}], w)
+    # the file is closed, with the rows written before the error
+    assert w.fd is None and w.sink is None
+    assert pq.read_table(fn).column('a').to_pylist() == [1]
+    fd = open(fn, 'wb')
+    w = Writer(fd, batch_size=2)
+    with pytest.raises(TypeError, match="column 'a'"):
+        # raised when the last batch is written in finish
+        Converter(two_pass=True).convert([{'a': 1}, {'a': 2}, {'a': 'x'}], w)
+    assert w.fd is None and w.sink is None
+    # the file object passed to the writer is left open
+    assert not fd.closed
+    fd.close()
+    Converter().convert([{'a': 1}, {'a': 2}], Writer(fn, batch_size=1))
+    assert pq.read_table(fn).column('a').to_pylist() == [1, 2]
+    # mixed types in the first batch
+    Converter().convert([{'a': 1}, {'a': 'x'}], Writer(fn))
+    assert pq.read_table(fn).column('a').to_pylist() == ['1', 'x']
+
+
+def test_cli(tmp_path):
+    from json_excel_converter.cli import main
+    src = tmp_path / 'data.jsonl'
+    src.write_text('{"a": 1, "b": {"c": "x"}}\n{"a": 2}\n')
+    assert main([str(src), str(tmp_path / 'out.parquet')]) == 0
+    assert pq.read_table(str(tmp_path / 'out.parquet')).to_pylist() == [
+        {'a': 1, 'b.c': 'x'}, {'a': 2, 'b.c': None}
+    ]
+
+
+def test_int_column_with_floats():
+    w = Writer(batch_size=1)
+    with pytest.raises(TypeError, match="column 'a'"):
+        Converter().convert([{'a': 1}, {'a': 1.5}], w)
+    with pytest.raises(TypeError, match="column 'a'"):
+        Converter().convert([{'a': 1}, {'a': '2'}], Writer(batch_size=1))
+    # no loss
+    w = Writer(batch_size=1)
+    Converter().convert([{'a': 1}, {'a': 2.0}, {'a': None}], w)
+    assert pq.read_table(BytesIO(w.file.getvalue())).column('a').to_pylist() == [1, 2, None]
+    # ints and floats in the first batch
+    w = Writer()
+    Converter().convert([{'a': 1}, {'a': 2.7}], w)
+    table = pq.read_table(BytesIO(w.file.getvalue()))
+    assert table.schema.field('a').type == pa.float64()
+    assert table.column('a').to_pylist() == [1.0, 2.7]
+    # an int column given in types gets floats converted
+    w = Writer(batch_size=1, types={'a': pa.float64()})
+    Converter().convert([{'a': 1}, {'a': 2.7}], w)
+    assert pq.read_table(BytesIO(w.file.getvalue())).column('a').to_pylist() == [1.0, 2.7]
@@ -0,0 +1,83 @@
+import pytest
+
+from json_excel_converter.buffer import RecordCache, RowBuffer, SpillingRowBuffer
+from json_excel_converter.linearize import Columns, Row, Value
+
+
+def test_row_buffer():
+    buf = RowBuffer()
+    buf.append([Value(1)], {'a': 1})
+    assert len(buf) == 1
+    assert list(buf) == [([Value(1)], {'a': 1})]
+    # list style access to the rows
+    assert buf[0] == [Value(1)]
+    assert buf[-1:] == [[Value(1)]]
+    assert buf.data() == [{'a': 1}]
+    buf.clear()
+    assert len(buf) == 0
+
+
+def test_spilling_row_buffer():
+    buf = SpillingRowBuffer(max_cells=3)
+    rows = [
+        ([Value(idx, path='a'), Value('', 2)], {'a': idx})
+        for idx in range(5)
+    ]
+    buf.append(*rows[0])
+    assert buf.spill is None
+    for r in rows[1:]:
+        buf.append(*r)
+    assert buf.spill is not None
+    assert buf.rows == []
+    assert len(buf) == 5
+    assert list(buf) == rows
+    # can be iterated repeatedly and appended to after iteration
+    assert list(buf) == rows
+    buf.append(*rows[0])
+    assert list(buf) == rows + rows[:1]
+    assert buf[1] == rows[1][0]
+    assert buf[-1] == rows[0][0]
+    assert buf[1:3] == [rows[1][0], rows[2][0]]
+    with pytest.raises(IndexError):
+        buf[6]
+
+    buf.clear()
+    assert buf.spill is None
+    assert len(buf) == 0
+
+
+def test_spilling_compact_rows():
+    cols = Columns()
+    records = [{'a': [idx] * (idx % 3 + 1), 'b': idx} for idx in range(6)]
+    for r in records:
+        cols.check(r)
+    plan = cols.compile()
+    rows = [plan.output(r) for r in records]
+    assert isinstance(rows[0], Row)
+
+    buf = SpillingRowBuffer(max_cells=2)
+    for row, r in zip(rows, records):
+        buf.append(row, r)
+    assert buf.spill is not None
+    assert len(buf.layouts) == 3
+    loaded = list(buf)
+    assert [r for _, r in loaded] == records
+    assert [row for row, _ in loaded] == rows
+    assert loaded[0][0].layout is loaded[3][0].layout
+
+
+def test_record_cache():
+    records = [{'a': idx} for idx in range(5)]
+    cache = RecordCache(iter(records), max_resident=2)
+    it = iter(cache)
+    assert [next(it), next(it)] == records[:2]
+    assert cache.spill is None
+    # an interrupted iteration replays the consumed records and continues the source
+    it = iter(cache)
+    assert [next(it) for _ in range(4)] == records[:4]
+    assert cache.spill is not None
+    assert cache.records == []
+    assert list(cache) == records
+    assert list(cache) == records
+    assert len(cache) == 5
+    cache.close()
@@ -1,4 +1,5 @@
-from json_excel_converter.linearize import Columns, Value
+from json_excel_converter.linearize import Columns, LayoutCache, Value, fingerprint, \
+    layout_width, padding_template
 from json_excel_converter.options import Options
 
 
@@ -105,3 +106,131 @@ def test_array_header_translation():
     assert list(cols.get_header_row(0)) == [
         Value('a 1', 1, path='a'), Value('a 2', 1, path='a'), Value('b', 1, path='b')
     ]
+
+
+def test_compiled_output():
+    records = [
+        {'a': [{'c': 'c1'}, {'c': 'c2', 'd': 'd'}], 'b': 'bb'},
+        {'a': [{'c': 'c1'}], 'e': {'f': [1, 2, 3]}},
+        {'a': {'c': 'c3'}, 'b': None, 'e': {'f': 1}},
+        {'e': None},
+        {},
+    ]
+    cols = Columns()
+    for r in records:
+        cols.check(r)
+    plan = cols.compile()
+    assert plan.columns_taken == cols.columns_taken
+    for r in records:
+        assert plan.output(r) == list(cols.output(r))
+
+
+def test_cached_sizes_invalidated():
+    cols = Columns()
+    cols.check({'a': [{'c': 'c1'}], 'b': 'bb'})
+    assert cols.columns_taken == 2
+    assert cols.depth == 2
+
+    assert cols.check({'a': [{'c': 'c1'}, {'c': 'c2', 'd': {'e': 1}}]})
+    assert cols.columns['a'].columns_taken == 2
+    assert cols.columns_taken == 5
+    assert cols.depth == 3
+
+    assert not cols.check({'a': [{'c': 'c1'}], 'b': 'bb'})
+    assert cols.columns_taken == 5
+
+
+def test_key_order_cache():
+    calls = []
+
+    def sort_key(k):
+        calls.append(k)
+        return k
+
+    cols = Columns(Options(sort_key=sort_key))
+    cols.check({'b': 1, 'a': 1})
+    assert list(cols.columns) == ['a', 'b']
+    calls.clear()
+    cols.check({'a': 2, 'b': 2})
+    assert not calls
+    cols.check({'a': 2, 'c': 2})
+    assert calls
+    assert list(cols.columns) == ['a', 'b', 'c']
+
+
+def test_compact_row():
+    cols = Columns()
+    val = {'a': [{'c': 'c1'}], 'b': 'bb'}
+    cols.check({'a': [{'c': 'c1'}, {'c': 'c2'}], 'b': 'bb'})
+    row = cols.compile().output(val)
+    assert row.values == ['c1', '', 'bb']
+    assert row.layout == (('a.c', 1), (None, 1), ('b', 1))
+    assert list(row) == [Value('c1', 1, path='a.c'), Value('', 1), Value('bb', 1, path='b')]
+    assert row == list(row)
+    assert row != None  # noqa: E711
+    assert row != 1
+
+
+def test_fingerprint():
+    assert fingerprint({'a': 1, 'b': 'x'}) == fingerprint({'a': 2, 'b': 'y'})
+    # key order, None and dicts in place of primitives make a difference
+    assert fingerprint({'a': 1, 'b': 'x'}) != fingerprint({'b': 'x', 'a': 1})
+    assert fingerprint({'a': 1}) != fingerprint({'a': None})
+    assert fingerprint({'a': 1}) != fingerprint({'a': {'b': 1}})
+    assert fingerprint({'a': [1, 2]}) != fingerprint({'a': [1]})
+    assert fingerprint({'a': [1, 2]}) != fingerprint({'a': [1, None]})
+    assert fingerprint({'a': [{'b': 1}, {'c': 1}]}) != fingerprint({'a': [{'b': 1}, {'b': 1}]})
+    # array items are checked independently of their position
+    assert fingerprint({'a': [{'b': 1}, {'c': [1]}]}) == fingerprint({'a': [{'c': [2]}, {'b': 3}]})
+
+
+def test_layout_cache():
+    cols = Columns()
+    cols.check({'a': {'b': 1, 'c': 2}, 'd': [1, 2]})
+    plan = cols.compile()
+    row = plan.output({'a': 1, 'd': [3]})
+    assert row.layout == (('a', 2), ('d', 1), (None, 1))
+    assert padding_template(row.layout)(row.values + ['']) == (1, '', 3, '')
+    assert padding_template(plan.output({'a': {'b': 1, 'c': 2}, 'd': [1, 2]}).layout) is None
+
+    cache = LayoutCache(layout_width, maxsize=1)
+    assert cache(row.layout) == 4
+    assert cache(plan.output({'a': 2, 'd': [4]}).layout) == 4
+    assert len(cache) == 1
+    assert cache((('x', 1), ('y', 2))) == 3
+    assert len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_url_evaluated_once_per_record():
+    calls = []
+
+    def url(data):
+        calls.append(data['id'])
+        return 'https://test.org/%s' % data['id']
+
+    options = Options()
+    options['a'].url = url
+    cols = Columns(options)
+    val = {'id': 1, 'a': ['x', 'y', 'z']}
+    cols.check(val)
+
+    assert [v.url for v in cols.output(val)] == [None] + ['https://test.org/1'] * 3
+    assert calls == [1]
+    calls.clear()
+    row = cols.compile().output(val)
+    assert [v.url for v in row] == [None] + ['https://test.org/1'] * 3
+    assert calls == [1]
+
+
+def test_slots():
+    cols = Columns()
+    cols.check({'a': [{'b': 1}, {'b': 2, 'c': [1, 2]}], 'd': None})
+    slots = cols.slots()
+    assert len(slots) == cols.columns_taken
+    assert slots == [
+        ('a', 0, 'b', 0), ('a', 0, 'c', 0), ('a', 0, 'c', 1),
+        ('a', 1, 'b', 0), ('a', 1, 'c', 0), ('a', 1, 'c', 1),
+        ('d', 0)
+    ]
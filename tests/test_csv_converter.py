@@ -1,5 +1,6 @@
-from json_excel_converter import Converter
+from json_excel_converter import Converter, Options
 from json_excel_converter.csv import Writer
+from json_excel_converter.linearize import Value
 
 
 def test_csv_converter():
@@ -44,3 +45,152 @@ a,a,a
 1,2,
 1,2,3
     """.strip().replace('\r\n', '\n')
+
+
+def test_array_grow_restarts():
+    data = [
+        {'a': ['1']},
+        {'a': ['1', '2']},
+        {'a': ['1', '2', '3']},
+    ]
+    conv = Converter()
+    conv.convert(data, Writer())
+    assert conv.restarts == 2
+
+
+def test_two_pass():
+    data = [
+        {'a': ['1']},
+        {'a': ['1', '2']},
+        {'a': ['1', '2', '3'], 'b': 'x'},
+    ]
+    conv = Converter(two_pass=True)
+    w = Writer()
+    conv.convert(data, w)
+    assert conv.restarts == 0
+    assert w.file.getvalue().strip().replace('\r\n', '\n') == """
+a,a,a,b
+1,,,
+1,2,,
+1,2,3,x
+    """.strip().replace('\r\n', '\n')
+
+
+def test_shape_cache():
+    data = [
+        {'a': ['1'], 'b': {'c': 1}},
+        {'a': ['2'], 'b': {'c': 2}},
+        {'a': ['1', '2']},
+        {'a': ['3'], 'b': {'c': 3}},
+    ]
+    expected = Writer()
+    Converter().convert(data, expected)
+
+    conv = Converter(shape_cache_size=2)
+    w = Writer()
+    conv.convert(data, w)
+    assert w.file.getvalue() == expected.file.getvalue()
+    # first pass: miss, hit, miss (the record is remembered and the conversion restarted),
+    # second pass: all hits
+    assert conv.shape_cache.hits == 5
+    assert conv.shape_cache.misses == 2
+    assert conv.shape_cache.hit_rate == 5 / 7
+
+
+def test_batch_value_translator():
+    calls = []
+
+    def translator(values, path, index, cardinality):
+        calls.append((path, index, list(values)))
+        return [v.upper() for v in values]
+
+    data = [
+        {'a': ['x', 'y'], 'b': 'z'},
+        {'a': ['u'], 'b': 'v'},
+        {'a': ['w'], 'b': 't'},
+    ]
+    options = Options()
+    options['a'].batch_value_translator = translator
+    conv = Converter(options, chunk_size=2)
+    w = Writer()
+    conv.convert(data, w)
+    assert w.file.getvalue().strip().replace('\r\n', '\n') == """
+a,a,b
+X,Y,z
+U,,v
+W,,t
+    """.strip().replace('\r\n', '\n')
+    assert calls == [
+        ('a', 0, ['x', 'u']),
+        ('a', 1, ['y']),
+        ('a', 0, ['w']),
+    ]
+
+
+def test_batched_rows():
+    data = [
+        {'a': ['1', '2'], 'b': {'c': 1, 'd': 2}, 'e': None},
+        {'a': ['3'], 'e': 'x'},
+        {'b': {'c': 3, 'd': 4}},
+    ]
+    w = Writer(batch_size=2)
+    Converter(two_pass=True).convert(data, w)
+    assert w.file.getvalue().strip().replace('\r\n', '\n') == """
+a,a,b,,e
+,,c,d,
+1,2,1,2,
+3,,,,x
+,,3,4,
+""".strip()
+    assert len(w.templates) == 3
+
+    # rows not yet written are discarded on reset as well
+    w = Writer(batch_size=10)
+    w.start()
+    w.write_header([Value('a')])
+    w.reset()
+    w.write_header([Value('b')])
+    w.finish()
+    assert w.file.getvalue().strip() == 'b'
+
+
+def test_reproject():
+    data = [
+        {'a': ['1'], 'b': None},
+        {'a': ['1', '2'], 'b': {'x': 1}},
+        {'a': ['1', '2', '3'], 'b': {'x': 2, 'y': [3, 4]}, 'c': 'c'},
+        {'b': {'y': [5]}},
+    ]
+    conv = Converter()
+    restarted = Writer()
+    conv.convert(data, restarted)
+    assert conv.restarts == 2
+
+    # a generator can not be iterated again, the rows are re-projected instead
+    w = Writer(reproject=True, batch_size=2)
+    conv.convert((d for d in data), w)
+    assert conv.restarts == 0
+    assert w.file.getvalue() == restarted.file.getvalue()
+    assert w.file.getvalue().strip().replace('\r\n', '\n') == """
+a,a,a,b,,,c
+,,,x,y,y,
+1,,,,,,
+1,2,,1,,,
+1,2,3,2,3,4,c
+,,,,5,,
+""".strip()
+
+
+def test_one_shot_iterator():
+    data = [
+        {'a': ['1']},
+        {'a': ['1', '2']},
+        {'a': ['1', '2', '3']},
+    ]
+    expected = Writer()
+    Converter().convert(data, expected)
+
+    for conv in (Converter(max_resident_records=1), Converter(two_pass=True)):
+        w = Writer()
+        conv.convert((d for d in data), w)
+        assert w.file.getvalue() == expected.file.getvalue()
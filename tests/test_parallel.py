@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from io import StringIO
+
+import pytest
+
+from json_excel_converter import Converter, Options, converter
+from json_excel_converter.csv import Writer
+from json_excel_converter.linearize import Columns
+from json_excel_converter.schema import merge_schemas, save_schema
+
+DATA = [
+    {'a': [{'b': str(idx)}] * (idx % 4), 'c': idx, 'd': {'e': idx} if idx % 5 else None}
+    for idx in range(50)
+]
+
+
+def convert(conv):
+    w = Writer()
+    conv.convert(DATA, w)
+    return w.file.getvalue()
+
+
+def test_merge():
+    cols1 = Columns()
+    cols1.check({'a': [1], 'b': {'c': 1}})
+    cols2 = Columns()
+    cols2.check({'a': [1, 2, 3], 'b': {'d': 1}, 'e': 1})
+    cols1.merge(cols2)
+    assert cols1.dump() == [
+        ['a', 3, None], ['b', 1, [['c', 1, None], ['d', 1, None]]], ['e', 1, None]
+    ]
+    assert cols1.columns_taken == 6
+
+
+def test_merge_ordering():
+    cols1 = Columns(Options(ordering=['c', 'b', 'a']))
+    cols1.check({'a': 1})
+    cols2 = Columns(Options(ordering=['c', 'b', 'a']))
+    cols2.check({'b': 1, 'c': 1})
+    cols1.merge(cols2)
+    # existing columns keep their place, new ones are appended as check appends them
+    assert list(cols1.columns) == ['a', 'c', 'b']
+    sequential = Columns(Options(ordering=['c', 'b', 'a']))
+    sequential.check({'a': 1})
+    sequential.check({'b': 1, 'c': 1})
+    assert list(sequential.columns) == list(cols1.columns)
+
+
+def test_parallel_sort_order():
+    options = Options(sort_key=lambda k: (-len(k), k))
+    data = [{'bb': idx, 'c': {'y': 1}} if idx < 10 else {'a': idx, 'ddd': 1, 'c': {'x': 1}}
+            for idx in range(30)]
+    sequential = Converter(options).infer_schema(data)
+    with ThreadPoolExecutor(2) as executor:
+        parallel = Converter(options, executor=executor, chunk_size=7).infer_schema(data)
+    assert parallel.dump() == sequential.dump()
+    assert [h.value for h in parallel.get_header_row(0)] == ['bb', 'c', 'ddd', 'a']
+
+
+def test_merge_conflict():
+    cols1 = Columns()
+    cols1.check({'a': {'b': 1}})
+    cols2 = Columns()
+    cols2.check({'a': 1})
+    with pytest.raises(ValueError):
+        cols1.merge(cols2)
+    # primitive followed by a dict is accepted by check as well
+    cols2.merge(cols1)
+    assert cols2.dump() == [['a', 1, [['b', 1, None]]]]
+
+
+def test_merge_schemas():
+    data1 = [{'a': [1, 2]}]
+    data2 = [{'a': [1], 'b': {'c': 1}}]
+    files = []
+    for data in (data1, data2):
+        f = StringIO()
+        save_schema(Converter().infer_schema(data), f)
+        f.seek(0)
+        files.append(f)
+    merged = merge_schemas(files)
+    assert merged.dump() == Converter().infer_schema(data1 + data2).dump()
+
+
+def test_thread_pool():
+    expected = convert(Converter(two_pass=True))
+    with ThreadPoolExecutor(4) as executor:
+        assert convert(Converter(executor=executor, chunk_size=7)) == expected
+
+
+def test_process_pool():
+    expected = convert(Converter(two_pass=True))
+    with ProcessPoolExecutor(2) as executor:
+        conv = Converter(executor=executor, chunk_size=7)
+        conv.max_pending_chunks = 2
+        assert convert(conv) == expected
+
+
+def test_worker_payload(monkeypatch):
+    class SyncExecutor(Executor):
+        def submit(self, fn, *args):
+            future = Future()
+            future.set_result(fn(*args))
+            return future
+
+    loads = []
+    load = Columns.load.__func__
+
+    def counted_load(cls, *args, **kwargs):
+        if kwargs.get('parent') is None:
+            loads.append(args)
+        return load(cls, *args, **kwargs)
+
+    monkeypatch.setattr(Columns, 'load', classmethod(counted_load))
+    monkeypatch.setattr(converter, '_worker_payloads', OrderedDict())
+    expected = convert(Converter(two_pass=True))
+    assert convert(Converter(executor=SyncExecutor(), chunk_size=7)) == expected
+    # the layout is unpickled once, not for each of the 8 chunks
+    assert len(loads) == 1
+    # the options of the inference and the options with the layout of the output
+    assert len(converter._worker_payloads) == 2
@@ -0,0 +1,96 @@
+import zipfile
+from io import BytesIO, StringIO
+
+import pytest
+
+from json_excel_converter import Converter
+from json_excel_converter.csv import Writer as CSVWriter
+from json_excel_converter.reader import CSVReader, HeaderLayout, XLSXReader
+from json_excel_converter.xlsx import StreamingWriter
+from json_excel_converter.xlsx.native import NativeWriter
+
+data = [
+    {
+        'a': 1,
+        'b': [{'c': 'x', 'd': 2.5}, {'c': 'y'}],
+        'e': [1, 2],
+        'f': {'g': 'x & y', 'h': {'i': True}}
+    },
+    {'a': 2, 'e': [3]},
+    {'a': 3, 'j': 'new'},
+]
+
+
+def test_header_layout():
+    layout = HeaderLayout([
+        ['a', 'b', '', 'b', '', 'f', '', 'e', 'e', 'j'],
+        ['', 'c', 'd', 'c', 'd', 'g', 'h', '', '', ''],
+        ['', '', '', '', '', '', 'i', '', '', ''],
+    ])
+    assert layout.paths() == [
+        (0, 'a'), (1, 'b[0].c'), (2, 'b[0].d'), (3, 'b[1].c'), (4, 'b[1].d'),
+        (5, 'f.g'), (6, 'f.h.i'), (7, 'e[0]'), (8, 'e[1]'), (9, 'j')
+    ]
+    build = layout.compile()
+    assert build([1, '', '', 'y', '', None, 'z', 2]) == {
+        'a': 1, 'b': [None, {'c': 'y'}], 'f': {'h': {'i': 'z'}}, 'e': [2]
+    }
+
+    layout = HeaderLayout([['a', 'b'], ['c', '']], arrays=['a'])
+    assert layout.paths() == [(0, 'a[0].c'), (1, 'b')]
+
+
+def test_csv_reader(tmp_path):
+    path = str(tmp_path / 'test.csv')
+    Converter().convert(data, CSVWriter(path))
+    reader = CSVReader(path, header_rows=3)
+    expected = [
+        {
+            'a': '1',
+            'b': [{'c': 'x', 'd': '2.5'}, {'c': 'y'}],
+            'e': ['1', '2'],
+            'f': {'g': 'x & y', 'h': {'i': 'True'}}
+        },
+        {'a': '2', 'e': ['3']},
+        {'a': '3', 'j': 'new'},
+    ]
+    assert list(reader) == expected
+    assert list(reader) == expected
+
+    assert list(CSVReader(StringIO('a;b\n1;"x\r\ny"\n'), delimiter=';')) == [
+        {'a': '1', 'b': 'x\r\ny'}
+    ]
+
+
+@pytest.mark.parametrize('writer_class', [StreamingWriter, NativeWriter])
+def test_xlsx_reader(writer_class):
+    file = BytesIO()
+    Converter().convert(data, writer_class(file, sheet_name='export'))
+    reader = XLSXReader(file)
+    assert list(reader) == data
+    assert reader.layout.paths()[1] == (1, 'b[0].c')
+    # read again, by the sheet name
+    assert list(XLSXReader(file, sheet='export')) == data
+    with pytest.raises(KeyError):
+        list(XLSXReader(file, sheet='missing'))
+
+    # a header with no merged cells
+    file = BytesIO()
+    Converter().convert([{'a': {'b': 1}}, {'a': {'b': 2}}], writer_class(file))
+    assert list(XLSXReader(file, header_rows=2)) == [{'a': {'b': 1}}, {'a': {'b': 2}}]
+
+
+def test_xlsx_reader_large(tmp_path):
+    path = str(tmp_path / 'test.xlsx')
+    records = [{'id': i, 'tags': ['t%d' % t for t in range(i % 3)], 'o': {'x': i / 2}}
+               for i in range(3000)]
+    Converter().convert(records, NativeWriter(path, max_interned_strings=2))
+    reader = XLSXReader(path)
+    assert list(reader) == [
+        {k: v for k, v in r.items() if v != []} for r in records
+    ]
+    with zipfile.ZipFile(path) as z:
+        merges = XLSXReader.merges(z, 'xl/worksheets/sheet1.xml')
+        assert (0, 0, 1, 0) in merges
+        # a merged range split between the chunks
+        assert XLSXReader.merges(z, 'xl/worksheets/sheet1.xml', chunk_size=7) == merges
@@ -0,0 +1,57 @@
+from io import StringIO
+
+import pytest
+
+from json_excel_converter import Converter, LinearizationError
+from json_excel_converter.csv import Writer
+from json_excel_converter.linearize import Columns
+from json_excel_converter.schema import load_schema, save_schema
+
+
+def test_dump_load():
+    cols = Columns()
+    cols.check({'a': [{'c': 'c1'}, {'c': 'c2', 'd': 'd'}], 'b': 'bb', 'e': {}})
+    dumped = cols.dump()
+    assert dumped == [
+        ['a', 2, [['c', 1, None], ['d', 1, None]]],
+        ['b', 1, None],
+        ['e', 1, []],
+    ]
+    loaded = Columns.load(dumped)
+    assert loaded.dump() == dumped
+    assert loaded.columns['a'].children.columns['d'].path == 'a.d'
+    assert list(loaded.get_header_row(1)) == list(cols.get_header_row(1))
+
+
+def test_validate():
+    cols = Columns()
+    cols.check({'a': ['1', '2'], 'b': {'c': 1}})
+    assert cols.validate({'a': ['1'], 'b': {'c': 2}}) == []
+    assert cols.validate({'a': ['1', '2', '3']}) == [('cardinality', 'a', 2, 3)]
+    assert cols.validate({'d': 1}) == [('nochild', 'd', 1)]
+    assert cols.validate({'b': {'e': 1}}) == [('nochild', 'e', 1)]
+    assert cols.validate({'a': {'x': 1}}) == [('nochildren', 'a', {'x': 1})]
+    # validation does not modify the layout
+    assert cols.dump() == [['a', 2, None], ['b', 1, [['c', 1, None]]]]
+
+
+def test_convert_with_saved_schema():
+    data = [
+        {'a': ['1']},
+        {'a': ['1', '2']},
+    ]
+    f = StringIO()
+    save_schema(Converter().infer_schema(data), f)
+    f.seek(0)
+
+    conv = Converter(schema=load_schema(f))
+    w = Writer()
+    conv.convert(data, w)
+    assert w.file.getvalue().strip().replace('\r\n', '\n') == """
+a,a
+1,
+1,2
+    """.strip().replace('\r\n', '\n')
+
+    with pytest.raises(LinearizationError):
+        conv.convert([{'a': ['1', '2', '3']}], Writer())
@@ -0,0 +1,74 @@
+import json
+from io import StringIO
+
+import pytest
+
+from json_excel_converter import Converter
+from json_excel_converter.cli import main
+from json_excel_converter.csv import Writer
+from json_excel_converter.sources import JSONArraySource, JSONLinesSource, open_source
+
+records = [
+    {'a': [1, 2], 'b': 'hello, "world" ]'},
+    12345678,
+    {'a': [{'c': None}], 'b': {'d': [True, 1.5e10]}},
+    [],
+]
+
+
+def test_json_array_source():
+    text = ' \n[ ' + ' ,\n'.join(json.dumps(r) for r in records) + ' ] '
+    for chunk_size in (1, 3, 1000):
+        source = JSONArraySource(StringIO(text), chunk_size=chunk_size)
+        assert list(source) == records
+        # the file is seeked back on the next iteration
+        assert list(source) == records
+
+    numbers = [1.5e10, 2e3, -4.25e-2, 5, -0.5, 12345678901234567890, 1.25E+300, 0]
+    text = '[1.5e10,2E+3, -4.25e-2,5,-0.5 ,12345678901234567890,1.25E+300,0]'
+    for chunk_size in range(1, 41):
+        assert list(JSONArraySource(StringIO(text), chunk_size=chunk_size)) == numbers
+
+    assert list(JSONArraySource(StringIO('[]'))) == []
+    with pytest.raises(ValueError):
+        list(JSONArraySource(StringIO('{"a": 1}')))
+    with pytest.raises(ValueError):
+        list(JSONArraySource(StringIO('[1, 2')))
+    with pytest.raises(ValueError):
+        list(JSONArraySource(StringIO('[1 2]')))
+
+
+def test_json_lines_source(tmp_path):
+    path = str(tmp_path / 'data.jsonl')
+    with open(path, 'w') as f:
+        f.write('\n'.join(json.dumps(r) for r in records) + '\n\n')
+    source = open_source(path)
+    assert isinstance(source, JSONLinesSource)
+    assert list(source) == records
+    assert list(source) == records
+
+
+def test_convert_from_source():
+    data = [{'a': ['1']}, {'a': ['1', '2']}, {'a': ['1', '2', '3']}]
+    conv = Converter()
+    w = Writer()
+    conv.convert(JSONArraySource(StringIO(json.dumps(data)), chunk_size=4), w)
+    assert conv.restarts == 2
+    assert w.file.getvalue().strip().replace('\r\n', '\n') == """
+a,a,a
+1,,
+1,2,
+1,2,3
+""".strip()
+
+
+def test_cli(tmp_path):
+    data = [{'a': ['1']}, {'a': ['1', '2']}]
+    src = tmp_path / 'data.json'
+    src.write_text(json.dumps(data))
+    assert main([str(src), str(tmp_path / 'out.csv')]) == 0
+    assert (tmp_path / 'out.csv').read_text().strip().replace('\r\n', '\n') == """
+a,a
+1,
+1,2
+""".strip()
@@ -0,0 +1,135 @@
+import os
+import zipfile
+from io import BytesIO
+
+import pytest
+import xlsxwriter
+
+from json_excel_converter import Converter, Options
+from json_excel_converter.xlsx import DEFAULT_COLUMN_WIDTH, DEFAULT_ROW_HEIGHT
+from json_excel_converter.xlsx.formats import Bold, Centered, Format, LastUnderlined
+from json_excel_converter.xlsx.native import NativeWriter, StyleTable
+
+data = [
+    {'a': [1, 2], 'b': {'c': 'x & <y>', 'd': 2.5}, 'u': 'https://test.org/?a=1&b=2'},
+    {'a': [1, 2, 3], 'b': {'c': ' y'}, 'e': True},
+]
+
+
+def convert(writer_class, **kwargs):
+    options = Options()
+    options['u'].url = lambda d: d['u']
+    file = BytesIO()
+    w = writer_class(file, header_formats=(Centered, Bold, LastUnderlined),
+                     data_formats=(LastUnderlined,),
+                     column_widths={DEFAULT_COLUMN_WIDTH: 20, 'b.c': 30},
+                     row_heights={DEFAULT_ROW_HEIGHT: 20, 0: 40}, **kwargs)
+    Converter(options).convert(data, w)
+    return zipfile.ZipFile(file)
+
+
+def test_native_writer():
+    with convert(NativeWriter) as z:
+        assert z.testzip() is None
+        assert set(z.namelist()) == {
+            '[Content_Types].xml', '_rels/.rels', 'xl/workbook.xml', 'xl/_rels/workbook.xml.rels',
+            'xl/styles.xml', 'xl/worksheets/sheet1.xml', 'xl/worksheets/_rels/sheet1.xml.rels',
+            'xl/sharedStrings.xml'
+        }
+        sheet = z.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        rels = z.read('xl/worksheets/_rels/sheet1.xml.rels').decode('utf-8')
+        strings = z.read('xl/sharedStrings.xml').decode('utf-8')
+
+    assert sheet.count('<row ') == 4
+    assert '<row r="1" ht="40" customHeight="1">' in sheet
+    assert '<col min="4" max="4" width="30.7109375" customWidth="1"/>' in sheet
+    assert '<mergeCell ref="A1:A2"/>' in sheet
+    assert '<mergeCell ref="D1:E1"/>' in sheet
+    assert '<t>x &amp; &lt;y&gt;</t>' in strings
+    assert '<t xml:space="preserve"> y</t>' in strings
+    assert '<v>2.5</v>' in sheet
+    assert 't="b"><v>1</v>' in sheet
+    assert '<hyperlink ref="F3" r:id="rId1"/>' in sheet
+    assert 'Target="https://test.org/?a=1&amp;b=2"' in rels
+
+
+def test_native_writer_cell_hooks():
+    calls = []
+
+    class HookWriter(NativeWriter):
+        def write_cell(self, row, col, cell_data, cell_format, data):
+            calls.append((row, col))
+            super().write_cell(row, col, cell_data, cell_format, data)
+
+    with convert(NativeWriter) as z:
+        fast = z.read('xl/worksheets/sheet1.xml')
+    with convert(HookWriter) as z:
+        assert z.read('xl/worksheets/sheet1.xml') == fast
+    assert (3, 6) in calls
+
+
+def test_native_writer_rollover():
+    with convert(NativeWriter, max_rows=1, sheet_name='data') as z:
+        workbook = z.read('xl/workbook.xml').decode('utf-8')
+        second = z.read('xl/worksheets/sheet2.xml').decode('utf-8')
+    assert 'name="data (2)"' in workbook
+    assert second.count('<row ') == 3
+    assert '<mergeCell ref="D1:E1"/>' in second
+
+
+def test_native_writer_reset(tmp_path):
+    path = str(tmp_path / 'test.xlsx')
+    w = NativeWriter(path)
+    w.start()
+    assert os.path.exists(path)
+    w.reset()
+    assert not os.path.exists(path)
+
+
+def test_native_writer_existing_sheet():
+    workbook = xlsxwriter.Workbook(BytesIO())
+    with pytest.raises(ValueError, match='"workbook"'):
+        NativeWriter(workbook=workbook)
+    with pytest.raises(ValueError, match='"sheet"'):
+        NativeWriter(sheet=workbook.add_worksheet())
+    workbook.close()
+
+
+def test_style_table():
+    styles = StyleTable()
+    assert styles.add_format({}) == 0
+    bold = styles.add_format({'bold': True, 'align': 'center'})
+    assert styles.add_format({'bold': True, 'align': 'center'}) == bold
+    red = styles.add_format({'font_color': 'red', 'num_format': '0.00', 'border': 1})
+    assert red != bold
+    xml = styles.xml()
+    assert '<numFmt numFmtId="164" formatCode="0.00"/>' in xml
+    assert '<color rgb="FFFF0000"/>' in xml
+    assert '<cellXfs count="3">' in xml
+
+
+def test_shared_strings():
+    data = [{'status': 'ok' if i % 3 else 'failed', 'id': 'id%s' % i} for i in range(10)]
+    file = BytesIO()
+    Converter().convert(data, NativeWriter(file, max_interned_strings=4))
+    with zipfile.ZipFile(file) as z:
+        sheet = z.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        strings = z.read('xl/sharedStrings.xml').decode('utf-8')
+    # at most 4 strings per column are shared (including the header), the rest is inline
+    assert strings.count('<si>') == 2 + 2 + 3
+    assert sheet.count('t="inlineStr"') == 7
+    assert '<is><t>id9</t></is>' in sheet
+    assert sheet.count('t="s"') == 2 + 10 + 3
+
+    file = BytesIO()
+    Converter().convert(data, NativeWriter(file, max_interned_strings=0))
+    with zipfile.ZipFile(file) as z:
+        assert 'xl/sharedStrings.xml' not in z.namelist()
+
+
+def test_sheet_zip64():
+    # the sheet is streamed into the zip, it may exceed 2 GiB for a full sheet
+    file = BytesIO()
+    Converter().convert([{'a': 1}], NativeWriter(file))
+    with zipfile.ZipFile(file) as z:
+        assert z.getinfo('xl/worksheets/sheet1.xml').extract_version >= zipfile.ZIP64_VERSION
@@ -1,5 +1,16 @@
+import os
+import pickle
+import tracemalloc
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO
+
+import xlsxwriter
+
 from json_excel_converter import Converter, Options
-from json_excel_converter.xlsx import Writer, DEFAULT_COLUMN_WIDTH, DEFAULT_ROW_HEIGHT
+from json_excel_converter.buffer import SpillingRowBuffer
+from json_excel_converter.xlsx import Writer, StreamingWriter, ShardedWriter, Formatter, \
+    DEFAULT_COLUMN_WIDTH, DEFAULT_ROW_HEIGHT
 from json_excel_converter.xlsx.formats import (
     LastUnderlined,
     ColumnBorder,
@@ -105,3 +116,238 @@ def test_url():
     options['a'].url = lambda data: data['a']
     conv = Converter(options)
     conv.convert(data, w)
+
+
+def test_streaming_writer():
+    data = [
+        {'a': [1, 2], 'b': {'c': 'x', 'd': 2}},
+        {'a': [1, 2, 3], 'b': {'c': 'y'}},
+    ]
+    w = StreamingWriter('/tmp/test5.xlsx',
+                        header_formats=(Centered, Bold, LastUnderlined,),
+                        data_formats=(LastUnderlined,),
+                        row_heights={DEFAULT_ROW_HEIGHT: 20})
+    conv = Converter()
+    conv.convert(data, w)
+    assert conv.restarts == 0
+    assert not len(w.rows)
+
+    with zipfile.ZipFile('/tmp/test5.xlsx') as z:
+        sheet = z.read('xl/worksheets/sheet1.xml').decode('utf-8')
+    assert sheet.count('<row ') == 4
+    assert '<mergeCell ref="A1:A2"/>' in sheet
+    assert '<mergeCell ref="D1:E1"/>' in sheet
+    assert '<is><t>y</t></is>' in sheet
+
+
+def test_writer_spilling_buffer():
+    data = [{'a': idx, 'b': [idx, idx], 'c': {'d': idx}} for idx in range(10)]
+    w = Writer('/tmp/test6.xlsx', row_buffer=SpillingRowBuffer(max_cells=5),
+               row_heights={DEFAULT_ROW_HEIGHT: 20})
+    Converter().convert(data, w)
+    assert w.rows.spill is not None
+    # the spilled rows are written to a constant_memory workbook
+    assert w.constant_memory
+    assert w.workbook_tmpdir is None
+
+    with zipfile.ZipFile('/tmp/test6.xlsx') as z:
+        sheet = z.read('xl/worksheets/sheet1.xml').decode('utf-8')
+    assert sheet.count('<row ') == 12
+    assert sheet.count('ht="20"') == 12
+    assert '<mergeCell ref="A1:A2"/>' in sheet
+    assert '<mergeCell ref="B1:B2"/>' in sheet
+
+
+def test_writer_spilling_buffer_memory(tmp_path):
+    def peak_memory(count):
+        w = Writer(str(tmp_path / 'memory.xlsx'), row_buffer=SpillingRowBuffer(max_cells=100))
+        w.start()
+        w.write_header([Value('a', path='a'), Value('b', 2, path='b')])
+        for idx in range(count):
+            w.write_row([Value(idx, path='a'), Value('x', path='b'), Value('', path='b')],
+                        None)
+        tracemalloc.start()
+        try:
+            w.finish()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    # the peak memory of writing the spilled rows does not grow with their number
+    assert peak_memory(8000) < peak_memory(2000) * 1.2
+
+
+def test_formatter_cache():
+    calls = []
+
+    class Counted(Format):
+        static = True
+
+        def data_format(self, cell_data, rowidx, colidx, first, last):
+            calls.append(colidx)
+            return {'bold': True}
+
+    class Negative(Format):
+        def data_format(self, cell_data, rowidx, colidx, first, last):
+            if isinstance(cell_data.value, int) and cell_data.value < 0:
+                return {'font_color': 'red'}
+            return {}
+
+    assert Format.static and Bold.static and LastUnderlined.static
+    assert not Negative.static
+
+    formatter = Formatter((Counted(), Negative(), LastUnderlined))
+    formatter.workbook = xlsxwriter.Workbook(BytesIO())
+    f1 = formatter.format(Value(1), 0, 0, True, False)
+    f2 = formatter.format(Value(2), 1, 0, False, False)
+    f3 = formatter.format(Value(-1), 2, 0, False, False)
+    f4 = formatter.format(Value(-2), 3, 0, False, True)
+    assert f1 is f2
+    assert f3 is not f2
+    assert f4 is not f3
+    assert len(formatter.properties_cache) == 3
+    # static formats are evaluated only when a new cell position is seen
+    assert len(calls) == 4
+    assert formatter.format(Value(3), 4, 0, False, False) is f2
+    assert len(calls) == 4
+
+
+def test_column_formats():
+    data = [{'a': i, 'b': {'c': i, 'd': -i}} for i in range(10)]
+
+    def count_calls(formatter):
+        calls = []
+        format = formatter.format
+
+        def counted(*args):
+            calls.append(args)
+            return format(*args)
+        formatter.format = counted
+        return calls
+
+    w = Writer(file=BytesIO(), data_formats=(Bold, LastUnderlined))
+    calls = count_calls(w.data_formatter)
+    Converter().convert(data, w)
+    # 3 columns in the first, middle and last rows
+    assert len(calls) == 9
+
+    class Negative(Format):
+        def data_format(self, cell_data, rowidx, colidx, first, last):
+            if cell_data.value < 0:
+                return {'font_color': 'red'}
+            return {}
+
+    w = Writer(file=BytesIO(), data_formats=(Bold, Negative()))
+    calls = count_calls(w.data_formatter)
+    Converter().convert(data, w)
+    assert len(calls) == 30
+
+
+def read_sheets(file):
+    with zipfile.ZipFile(file) as z:
+        return [
+            z.read(name).decode('utf-8') for name in sorted(z.namelist())
+            if name.startswith('xl/worksheets/sheet')
+        ]
+
+
+def test_sheet_rollover():
+    data = [{'a': {'b': i, 'c': i}} for i in range(5)]
+    for writer_class in (Writer, StreamingWriter):
+        file = BytesIO()
+        w = writer_class(file, sheet_name='data', max_rows=2,
+                         data_formats=(LastUnderlined,),
+                         column_widths={DEFAULT_COLUMN_WIDTH: 20})
+        Converter().convert(data, w)
+        sheets = read_sheets(file)
+        assert len(sheets) == 3
+        for sheet, rows in zip(sheets, (2, 2, 1)):
+            # the two header rows are repeated on every sheet
+            assert sheet.count('<row ') == rows + 2
+            assert '<mergeCell ref="A1:B1"/>' in sheet
+            assert '<col ' in sheet
+        with zipfile.ZipFile(file) as z:
+            workbook = z.read('xl/workbook.xml').decode('utf-8')
+        assert 'name="data (3)"' in workbook
+
+
+def test_sharded_writer(tmp_path):
+    assert pickle.loads(pickle.dumps(DEFAULT_COLUMN_WIDTH)) is DEFAULT_COLUMN_WIDTH
+
+    data = [{'a': [i] * (i % 3), 'b': 'x%s' % i} for i in range(7)]
+    pattern = str(tmp_path / 'shard-{:02d}.xlsx')
+    with ProcessPoolExecutor(2) as executor:
+        w = ShardedWriter(pattern, max_rows=3, executor=executor,
+                          data_formats=(Bold,), column_widths={DEFAULT_COLUMN_WIDTH: 20})
+        Converter().convert(data, w)
+    assert w.files == [pattern.format(idx) for idx in (1, 2, 3)]
+    for file, rows in zip(w.files, (3, 3, 1)):
+        sheet, = read_sheets(file)
+        assert sheet.count('<row ') == rows + 1
+
+    class DeferredExecutor:
+        """
+        Runs the submitted calls only when their result is requested
+        """
+
+        def submit(self, func, *args):
+            future = Future()
+            future.result = lambda timeout=None: func(*args)
+            return future
+
+    # one pending shard per worker by default
+    assert w.max_pending_shards == 2
+    assert ShardedWriter(pattern, executor=DeferredExecutor()).max_pending_shards == 1
+
+    w = ShardedWriter(pattern, max_rows=2, executor=DeferredExecutor())
+    w.start()
+    w.write_header([Value('a')])
+    for idx in range(7):
+        w.write_row([Value(idx)], None)
+        # a single pending shard and the rows of the next one are kept
+        assert len(w.pending) <= 1
+        assert len(w.rows) < 2
+    w.finish()
+    assert len(w.files) == 4
+
+
+def test_interned_strings():
+    data = [{'a': ''.join(['o', 'k']), 'b': [''.join(['o', 'k'])]} for _ in range(3)]
+    w = Writer(BytesIO(), max_interned_strings=1)
+    Converter().convert(data, w)
+    rows = [list(r.values) for r, _ in w.rows]
+    assert rows[0][0] is rows[1][0] is rows[2][0]
+    # interned per column
+    assert rows[0][1] is not rows[0][0]
+    assert rows[0][1] is rows[2][1]
+
+
+def test_rows_compatibility():
+    data = [{'a': 1}, {'a': 2}]
+
+    class RawWriter(Writer):
+        def after_rows(self):
+            self.seen = (self.rows[1], self.rows.data())
+
+    w = RawWriter(BytesIO())
+    Converter().convert(data, w)
+    row, raw = w.seen
+    assert list(row.values) == [2]
+    assert raw == data
+    assert not hasattr(w, 'raw')
+
+
+def test_streaming_writer_temp_files():
+    w = StreamingWriter(BytesIO())
+    w.start()
+    tmpdir = w.workbook_tmpdir
+    w.write_header([Value('a')])
+    for idx in range(3):
+        w.write_row([Value(idx)], None)
+    assert os.listdir(tmpdir)
+    # the rows flushed to the temporary files are dropped with the workbook
+    w.reset()
+    assert not os.path.exists(tmpdir)
+
+    Converter().convert([{'a': 1}], w)
+    assert w.workbook_tmpdir is None